@@ -3,13 +3,31 @@
 
 from .idf import IdfFile
 
+import importlib
 
-def open(idfile, mode='rb', header=None):
+
+# submodules imported on first attribute access, see __getattr__
+SUBMODULES = {
+    'archive', 'asciigrid', 'batch', 'calc', 'chunked', 'cli', 'diff',
+    'focal', 'idfraster', 'io', 'overview', 'rasterize', 'serve',
+    'stackstate', 'stats', 'voxel',
+    }
+
+
+def open(idffile, mode='rb', header=None, dtype=None):
     '''IdfFile instance from file'''
-    return IdfFile(idfile, mode=mode, header=header)
+    return IdfFile(idffile, mode=mode, header=header, dtype=dtype)
 
 
 def read(idffile, masked=False):
     '''read IDF file and return data array'''
-    with open(idfile) as src:
+    with open(idffile) as src:
         return src.read(masked=masked)
+
+
+def __getattr__(name):
+    '''import submodule on first access to keep import idfpy light'''
+    if name in SUBMODULES:
+        return importlib.import_module('.' + name, __name__)
+    raise AttributeError(
+        'module {m!r} has no attribute {n!r}'.format(m=__name__, n=name))
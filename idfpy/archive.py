@@ -0,0 +1,166 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from idfpy import idf
+
+import fnmatch
+import io
+import struct
+import tarfile
+import zipfile
+
+
+# zip local file header, filename and extra field lengths at bytes 26 to 30
+ZIP_LOCAL_HEADER = struct.Struct('<4s22xHH')
+ZIP_LOCAL_SIGNATURE = b'PK\x03\x04'
+
+
+class WindowFile(io.RawIOBase):
+    """Read-only file object for byte range offset:offset + size of a file
+
+    Used to read uncompressed archive members with seeks directly in the
+    archive file.
+    """
+    def __init__(self, filepath, offset, size):
+        self.f = open(filepath, 'rb')
+        self.offset = offset
+        self.size = size
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, position, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            position += self.position
+        elif whence == io.SEEK_END:
+            position += self.size
+        if position < 0:
+            raise ValueError('negative seek position {p:d}'.format(
+                p=position))
+        self.position = position
+        return self.position
+
+    def readinto(self, buffer):
+        n = max(min(len(buffer), self.size - self.position), 0)
+        if not n:
+            return 0
+        self.f.seek(self.offset + self.position)
+        n = self.f.readinto(memoryview(buffer)[:n])
+        self.position += n
+        return n
+
+    def close(self):
+        self.f.close()
+        super().close()
+
+
+def zip_data_offset(f, zipinfo):
+    '''offset of member data in zip file from its local header'''
+    f.seek(zipinfo.header_offset)
+    signature, namelength, extralength = ZIP_LOCAL_HEADER.unpack(
+        f.read(ZIP_LOCAL_HEADER.size))
+    if signature != ZIP_LOCAL_SIGNATURE:
+        raise IOError('bad local header of {n:} in zip file'.format(
+            n=zipinfo.filename))
+    return zipinfo.header_offset + ZIP_LOCAL_HEADER.size + \
+        namelength + extralength
+
+
+class IdfArchive(object):
+    """Read Idf files inside zip or tar archives without extracting
+
+    Members stored without compression are read with seeks directly in
+    the archive, so reading rows or cells only reads the bytes needed.
+    Compressed members are decompressed while reading.
+    """
+    def __init__(self, filepath):
+        self.filepath = str(filepath)
+        if zipfile.is_zipfile(self.filepath):
+            self.archive = zipfile.ZipFile(self.filepath)
+            self.members = {i.filename: i for i in self.archive.infolist()
+                if not i.is_dir()}
+        elif tarfile.is_tarfile(self.filepath):
+            self.archive = tarfile.open(self.filepath)
+            self.members = {m.name: m for m in self.archive.getmembers()
+                if m.isfile()}
+        else:
+            raise ValueError('{f:} is not a zip or tar archive'.format(
+                f=self.filepath))
+
+    def __repr__(self):
+        return '{s.__class__.__name__:}(filepath={s.filepath:})'.format(
+            s=self)
+
+    def __enter__(self):
+        """enter with statement block"""
+        return self
+
+    def __exit__(self, *args):
+        """exit with statement block"""
+        self.close()
+
+    def close(self):
+        """close archive"""
+        self.archive.close()
+
+    def names(self, pattern='*.idf'):
+        """sorted names of members matching pattern (case-insensitive)"""
+        return sorted(n for n in self.members
+            if fnmatch.fnmatch(n.lower(), pattern.lower()))
+
+    def is_stored(self, name):
+        """True if member is stored uncompressed and unencrypted"""
+        member = self.members[name]
+        if isinstance(member, zipfile.ZipInfo):
+            return (member.compress_type == zipfile.ZIP_STORED and
+                not member.flag_bits & 0x1)
+        return isinstance(self.archive.fileobj, io.BufferedReader)
+
+    def open_member(self, name):
+        """seekable binary file object of member"""
+        member = self.members[name]
+        if self.is_stored(name):
+            if isinstance(member, zipfile.ZipInfo):
+                with open(self.filepath, 'rb') as f:
+                    offset = zip_data_offset(f, member)
+                size = member.file_size
+            else:
+                offset, size = member.offset_data, member.size
+            return io.BufferedReader(WindowFile(self.filepath, offset, size))
+        if isinstance(member, zipfile.ZipInfo):
+            return self.archive.open(member)
+        return self.archive.extractfile(member)
+
+    def open(self, name):
+        """IdfFile of member, closing it also closes the member"""
+        return idf.IdfFile(self.open_member(name), closefd=True)
+
+    def read_header(self, name):
+        """header of member"""
+        with self.open(name) as src:
+            return src.header
+
+    def read_array(self, name, masked=True):
+        """data of member as (masked) array"""
+        with self.open(name) as src:
+            return src.read(masked=masked)
+
+
+def list_idfs(filepath, pattern='*.idf'):
+    '''names of Idf files in zip or tar archive'''
+    with IdfArchive(filepath) as archive:
+        return archive.names(pattern=pattern)
+
+
+def read_array(filepath, name, masked=True):
+    '''read Idf file name inside zip or tar archive'''
+    with IdfArchive(filepath) as archive:
+        return archive.read_array(name, masked=masked)
@@ -0,0 +1,275 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from idfpy import idf
+
+import numpy as np
+
+from itertools import islice
+
+
+ASC_KEYS = {
+    'ncols': 'ncol',
+    'nrows': 'nrow',
+    'xllcorner': 'xmin',
+    'yllcorner': 'ymin',
+    'xllcenter': 'xmin',
+    'yllcenter': 'ymin',
+    'cellsize': 'cellsize',
+    'dx': 'dx',
+    'dy': 'dy',
+    'nodata_value': 'nodata',
+    }
+
+# largest number of cells formatted as text at once
+FORMAT_CELLS = 2**18
+
+
+def format_blocksize(ncol, blocksize=idf.BLOCKSIZE):
+    '''rows per block, at most FORMAT_CELLS cells unless a single row'''
+    return max(min(blocksize, FORMAT_CELLS // max(ncol, 1)), 1)
+
+
+def format_rows(values, decimals=3, delimiter=' '):
+    '''format 2D array as text, one line per row, in a single operation'''
+    nrow, ncol = values.shape
+    valuefmt = '%.{d:d}f'.format(d=decimals)
+    rowfmt = delimiter.join([valuefmt] * ncol) + '\n'
+    return (rowfmt * nrow) % tuple(values.ravel().tolist())
+
+
+def asc_header(header, decimals=3, nodata=None):
+    '''ESRI ASCII grid header lines from Idf header'''
+    if header['ieq']:
+        raise ValueError('cannot write non-equidistant grid to ASCII grid')
+    if nodata is None:
+        nodata = header['nodata']
+    lines = [
+        'ncols {:d}'.format(header['ncol']),
+        'nrows {:d}'.format(header['nrow']),
+        'xllcorner {!r}'.format(float(header['xmin'])),
+        'yllcorner {!r}'.format(float(header['ymin'])),
+        ]
+    if header['dx'] == header['dy']:
+        lines.append('cellsize {!r}'.format(float(header['dx'])))
+    else:
+        lines.append('dx {!r}'.format(float(header['dx'])))
+        lines.append('dy {!r}'.format(float(header['dy'])))
+    lines.append('NODATA_value {:.{d:d}f}'.format(nodata, d=decimals))
+    return '\n'.join(lines) + '\n'
+
+
+def _fill_nodata(values, header, nodata):
+    '''replace Idf nodata in values by nodata and return filled array'''
+    if isinstance(values, np.ma.MaskedArray):
+        return values.filled(nodata)
+    if nodata != header['nodata']:
+        values = np.where(values == header['nodata'], nodata, values)
+    return values
+
+
+def write_asc(ascfile, array, header, decimals=3, nodata=None):
+    '''write array to ESRI ASCII grid using Idf header'''
+    if nodata is None:
+        nodata = header['nodata']
+    nrow, ncol = array.shape
+    header = dict(header, nrow=nrow, ncol=ncol)
+    blocksize = format_blocksize(ncol)
+    with open(ascfile, 'w') as dst:
+        dst.write(asc_header(header, decimals=decimals, nodata=nodata))
+        for start in range(0, nrow, blocksize):
+            block = array[start:start + blocksize]
+            dst.write(format_rows(_fill_nodata(block, header, nodata),
+                decimals=decimals))
+
+
+def idf2asc(idffile, ascfile, decimals=3, nodata=None,
+        blocksize=idf.BLOCKSIZE):
+    '''convert Idf file to ESRI ASCII grid reading blocks of rows
+
+    Blocks are limited to FORMAT_CELLS cells.
+    '''
+    with idf.IdfFile(idffile) as src, open(ascfile, 'w') as dst:
+        if nodata is None:
+            nodata = src.header['nodata']
+        dst.write(asc_header(src.header, decimals=decimals, nodata=nodata))
+        blocksize = format_blocksize(src.header['ncol'], blocksize)
+        for start, block in src.iter_blocks(blocksize=blocksize):
+            dst.write(format_rows(_fill_nodata(block, src.header, nodata),
+                decimals=decimals))
+
+
+def read_asc_header(f):
+    '''read ESRI ASCII grid header from open file and return Idf header'''
+    values = {}
+    is_center = False
+    position = f.tell()
+    line = f.readline()
+    while line:
+        parts = line.split()
+        key = parts[0].lower() if parts else ''
+        if key not in ASC_KEYS:
+            break
+        values[ASC_KEYS[key]] = float(parts[1])
+        is_center = is_center or key.endswith('center')
+        position = f.tell()
+        line = f.readline()
+    f.seek(position)
+
+    ncol = int(values['ncol'])
+    nrow = int(values['nrow'])
+    dx = values.get('dx', values.get('cellsize'))
+    dy = values.get('dy', values.get('cellsize'))
+    if dx is None or dy is None:
+        raise ValueError('ASCII grid header has no cell size')
+    xmin = values['xmin']
+    ymin = values['ymin']
+    if is_center:
+        xmin -= dx / 2.
+        ymin -= dy / 2.
+    return {
+        'lahey': 1271,
+        'ncol': ncol,
+        'nrow': nrow,
+        'xmin': xmin,
+        'xmax': xmin + dx * ncol,
+        'ymin': ymin,
+        'ymax': ymin + dy * nrow,
+        'dmin': 0.,
+        'dmax': 0.,
+        'nodata': values.get('nodata', -9999.),
+        'ieq': False,
+        'itb': False,
+        'ivf': False,
+        'dx': dx,
+        'dy': dy,
+        }
+
+
+def iter_asc_blocks(f, ncol, blocksize=idf.BLOCKSIZE):
+    '''iterate over blocks of rows from open file positioned after header'''
+    remainder = np.empty(0, dtype=np.float32)
+    while True:
+        lines = list(islice(f, blocksize))
+        if not lines:
+            break
+        values = np.fromstring(''.join(lines), dtype=np.float32, sep=' ')
+        values = np.concatenate([remainder, values])
+        nrow = len(values) // ncol
+        remainder = values[nrow * ncol:]
+        if nrow:
+            yield values[:nrow * ncol].reshape(nrow, ncol)
+    if len(remainder):
+        raise ValueError('incomplete row at end of ASCII grid')
+
+
+def read_asc(ascfile, masked=True):
+    '''read ESRI ASCII grid and return (masked) array and Idf header'''
+    with open(ascfile) as src:
+        header = read_asc_header(src)
+        blocks = list(iter_asc_blocks(src, header['ncol']))
+    values = np.concatenate(blocks) if blocks else np.empty(
+        (0, header['ncol']), dtype=np.float32)
+    if values.shape[0] != header['nrow']:
+        raise ValueError('expected {:d} rows in ASCII grid, found {:d}'.format(
+            header['nrow'], values.shape[0]))
+    valid = values[values != header['nodata']]
+    if valid.size:
+        header['dmin'], header['dmax'] = valid.min(), valid.max()
+    if masked:
+        return np.ma.masked_values(values, header['nodata']), header
+    else:
+        return values, header
+
+
+def asc2idf(ascfile, idffile, blocksize=idf.BLOCKSIZE):
+    '''convert ESRI ASCII grid to Idf file writing blocks of rows'''
+    with open(ascfile) as src:
+        header = read_asc_header(src)
+        dmin, dmax = np.inf, -np.inf
+        nrow = 0
+        with idf.IdfFile(idffile, 'wb', header) as dst:
+            for block in iter_asc_blocks(src, header['ncol'], blocksize):
+                dst.write_rows(block, nrow)
+                nrow += block.shape[0]
+                valid = block[block != header['nodata']]
+                if valid.size:
+                    dmin = min(dmin, valid.min())
+                    dmax = max(dmax, valid.max())
+            if nrow != header['nrow']:
+                raise ValueError(
+                    'expected {:d} rows in ASCII grid, found {:d}'.format(
+                    header['nrow'], nrow))
+            if np.isfinite(dmin):
+                dst.header['dmin'], dst.header['dmax'] = dmin, dmax
+            dst.write_header()
+
+
+def format_xyz(block, x, y, nodata, decimals=3, xy_decimals=2,
+        delimiter=',', skip_nodata=True):
+    '''format block of rows with row and column centers y, x as XYZ text'''
+    valuefmt = '%.{d:d}f'.format(d=decimals)
+    coordfmt = '%.{d:d}f'.format(d=xy_decimals)
+    linefmt = delimiter.join([coordfmt, coordfmt, valuefmt]) + '\n'
+    if isinstance(block, np.ma.MaskedArray):
+        block = block.filled(nodata)
+    xx, yy = np.meshgrid(x, y)
+    if skip_nodata:
+        is_valid = block != nodata
+        xx, yy, block = xx[is_valid], yy[is_valid], block[is_valid]
+    values = np.column_stack([xx.ravel(), yy.ravel(), block.ravel()])
+    return (linefmt * len(values)) % tuple(values.ravel().tolist())
+
+
+def write_xyz(xyzfile, array, header, decimals=3, xy_decimals=2,
+        delimiter=',', skip_nodata=True, names=('x', 'y', 'z')):
+    '''write array to XYZ text file using Idf header'''
+    x, y = idf.cell_centers(header)
+    blocksize = format_blocksize(array.shape[1])
+    with open(xyzfile, 'w') as dst:
+        if names:
+            dst.write(delimiter.join(names) + '\n')
+        for start in range(0, array.shape[0], blocksize):
+            stop = start + blocksize
+            dst.write(format_xyz(array[start:stop], x, y[start:stop],
+                header['nodata'], decimals=decimals, xy_decimals=xy_decimals,
+                delimiter=delimiter, skip_nodata=skip_nodata))
+
+
+def idf2xyz(idffile, xyzfile, decimals=3, xy_decimals=2, delimiter=',',
+        skip_nodata=True, names=('x', 'y', 'z'), blocksize=idf.BLOCKSIZE):
+    '''convert Idf file to XYZ text file with one cell center per line
+
+    Blocks are limited to FORMAT_CELLS cells.
+    '''
+    with idf.IdfFile(idffile) as src, open(xyzfile, 'w') as dst:
+        if names:
+            dst.write(delimiter.join(names) + '\n')
+        x, y = idf.cell_centers(src.header)
+        blocksize = format_blocksize(src.header['ncol'], blocksize)
+        for start, block in src.iter_blocks(blocksize=blocksize):
+            stop = start + block.shape[0]
+            dst.write(format_xyz(block, x, y[start:stop],
+                src.header['nodata'], decimals=decimals,
+                xy_decimals=xy_decimals, delimiter=delimiter,
+                skip_nodata=skip_nodata))
+
+
+def read_xyz(xyzfile, delimiter=',', skip_header=None):
+    '''read XYZ text file and return x, y and z arrays'''
+    with open(xyzfile) as src:
+        if skip_header is None:
+            first = src.readline()
+            try:
+                [float(v) for v in first.split(delimiter)]
+                src.seek(0)
+            except ValueError:
+                pass
+        else:
+            for _ in range(skip_header):
+                src.readline()
+        values = np.fromstring(src.read().replace(delimiter, ' '),
+            dtype=np.float64, sep=' ')
+    values = values.reshape(-1, 3)
+    return values[:, 0], values[:, 1], values[:, 2]
@@ -0,0 +1,306 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from idfpy import asciigrid
+from idfpy import calc
+from idfpy import idf
+from idfpy import io
+from idfpy.lazy import optional_import
+
+import numpy as np
+
+from collections import Counter, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import glob
+import json
+import logging
+import os
+import shlex
+import threading
+
+
+# operations applied to every matched input file separately
+PER_FILE = ('convert', 'sample', 'clip')
+
+# operations combining all matched input files
+COMBINED = ('stack', )
+
+CONVERT_SUFFIX = {
+    'asc': '.asc',
+    'xyz': '.csv',
+    'tif': '.tif',
+    'idf': '.idf',
+    }
+
+DEFAULT_OUTPUT = {
+    'sample': '{parent}/{stem}_sample.csv',
+    'clip': '{parent}/{stem}_clip.idf',
+    }
+
+
+Task = namedtuple('Task', ['op', 'inputs', 'output', 'options'])
+
+
+def parse_value(value):
+    '''parse option value as JSON if possible, otherwise return string'''
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+def parse_line(line):
+    '''parse job line: op input [output] [key=value ...]'''
+    tokens = shlex.split(line)
+    positional = [t for t in tokens[1:] if '=' not in t]
+    job = {k: parse_value(v)
+        for k, v in (t.split('=', 1) for t in tokens[1:] if '=' in t)
+        }
+    job['op'] = tokens[0]
+    if positional:
+        job['input'] = positional[0]
+    if len(positional) > 1:
+        job['output'] = positional[1]
+    if len(positional) > 2:
+        raise ValueError('too many arguments in job line \'{l:}\''.format(
+            l=line.strip()))
+    return job
+
+
+def read_jobs(jobfile):
+    '''read jobs from JSON, YAML or line based job file'''
+    suffix = Path(jobfile).suffix.lower()
+    with open(jobfile) as f:
+        if suffix == '.json':
+            jobs = json.load(f)
+        elif suffix in ('.yml', '.yaml'):
+            yaml = optional_import('yaml', extra='yaml')
+            jobs = yaml.safe_load(f)
+        else:
+            jobs = [parse_line(l) for l in f
+                if l.strip() and not l.lstrip().startswith('#')]
+    if isinstance(jobs, dict):
+        jobs = jobs['jobs']
+    return jobs
+
+
+def expand(patterns, path='.'):
+    '''sorted list of files matching pattern or list of patterns'''
+    if isinstance(patterns, str):
+        patterns = [patterns]
+    return sorted({os.path.normpath(f)
+        for p in patterns for f in glob.glob(os.path.join(path, p))
+        })
+
+
+def format_output(template, inputfile, path='.'):
+    '''output filename relative to path from template with fields of input
+
+    Available fields are name, stem, suffix and parent, where parent is the
+    directory of the input file relative to path.
+    '''
+    inputpath = Path(inputfile)
+    output = template.format(
+        name=inputpath.name,
+        stem=inputpath.stem,
+        suffix=inputpath.suffix,
+        parent=os.path.relpath(str(inputpath.parent), path),
+        )
+    return os.path.normpath(os.path.join(path, output))
+
+
+def plan(jobs, path='.'):
+    '''expand jobs to tasks and count how often each input file is used
+
+    Tasks are ordered by input file, so that all operations on a file run
+    close together and the file can be released from the cache early.
+    Combined tasks read their inputs in tiles and are not counted.
+    '''
+    tasks = []
+    for job in jobs:
+        options = dict(job)
+        op = options.pop('op')
+        if op not in PER_FILE + COMBINED:
+            raise ValueError('unknown operation \'{o:}\''.format(o=op))
+        inputs = expand(options.pop('input'), path)
+        if not inputs:
+            raise ValueError('no match for \'{p:}\''.format(p=job['input']))
+        output = options.pop('output', None)
+        if op in PER_FILE:
+            if output is None and op == 'convert':
+                suffix = CONVERT_SUFFIX[options.get('format', 'asc')]
+                output = '{parent}/{stem}' + suffix
+            elif output is None:
+                output = DEFAULT_OUTPUT[op]
+            for inputfile in inputs:
+                tasks.append(Task(op, [inputfile],
+                    format_output(output, inputfile, path), options))
+        else:
+            if output is None:
+                raise ValueError('\'{o:}\' requires output'.format(o=op))
+            output = os.path.normpath(os.path.join(path, output))
+            inputs = [f for f in inputs if f != output]
+            tasks.append(Task(op, inputs, output, options))
+
+    outputs = Counter(t.output for t in tasks)
+    duplicates = [o for o, n in outputs.items() if n > 1]
+    if duplicates:
+        raise ValueError('output written more than once: {d:}'.format(
+            d=', '.join(duplicates)))
+
+    tasks.sort(key=lambda t: (t.op in COMBINED, t.inputs[0]))
+    usage = Counter(f for t in tasks if t.op in PER_FILE for f in t.inputs)
+    return tasks, usage
+
+
+class ArrayCache(object):
+    """Thread safe cache reading each Idf file once
+
+    Files are released when the last task using them has finished.
+    """
+    def __init__(self, usage):
+        self.usage = Counter(usage)
+        self.reads = Counter()
+        self._items = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def get(self, idffile):
+        """return header and masked array of Idf file"""
+        with self._lock:
+            filelock = self._locks.setdefault(idffile, threading.Lock())
+        with filelock:
+            if idffile not in self._items:
+                with idf.IdfFile(idffile) as src:
+                    self._items[idffile] = src.header, src.read(masked=True)
+                self.reads[idffile] += 1
+            header, array = self._items[idffile]
+        return header.copy(), array
+
+    def release(self, idffile):
+        """release Idf file when no longer used by any task"""
+        with self._lock:
+            self.usage[idffile] -= 1
+            if self.usage[idffile] <= 0:
+                self._items.pop(idffile, None)
+                self._locks.pop(idffile, None)
+
+
+def convert(task, cache):
+    '''convert Idf file to ASCII grid, XYZ, GeoTIFF or Idf'''
+    header, array = cache.get(task.inputs[0])
+    fmt = task.options.get('format', 'asc')
+    decimals = task.options.get('decimals', 3)
+    if fmt == 'asc':
+        asciigrid.write_asc(task.output, array, header, decimals=decimals,
+            nodata=task.options.get('nodata'))
+    elif fmt == 'xyz':
+        asciigrid.write_xyz(task.output, array, header, decimals=decimals,
+            delimiter=task.options.get('delimiter', ','))
+    elif fmt == 'tif':
+        from idfpy import idfraster
+        idfraster.write_raster(task.output, array, idf.geotransform(header),
+            header['nodata'], epsg=task.options.get('epsg', 28992))
+    elif fmt == 'idf':
+        io.write_array(task.output, array.copy(), header)
+    else:
+        raise ValueError('unknown format \'{f:}\''.format(f=fmt))
+
+
+def read_coords(task):
+    '''coordinates from option coords or from text file in coordsfile'''
+    if 'coords' in task.options:
+        return np.asarray(task.options['coords'], dtype=np.float64)
+    coordsfile = task.options['coordsfile']
+    delimiter = task.options.get('delimiter', ',')
+    try:
+        return np.loadtxt(coordsfile, delimiter=delimiter, usecols=(0, 1),
+            ndmin=2)
+    except ValueError:  # header line
+        return np.loadtxt(coordsfile, delimiter=delimiter, usecols=(0, 1),
+            ndmin=2, skiprows=1)
+
+
+def sample(task, cache):
+    '''sample Idf file at coordinates and write x, y, value to text file'''
+    header, array = cache.get(task.inputs[0])
+    coords = read_coords(task)
+    row, col, is_valid = idf.cell_indices(header, coords[:, 0], coords[:, 1])
+    values = np.full(len(coords), np.nan)
+    values[is_valid] = array.filled(np.nan)[row[is_valid], col[is_valid]]
+    with open(task.output, 'w') as dst:
+        dst.write('x,y,value\n')
+        for (x, y), value in zip(coords, values):
+            dst.write('{x:.3f},{y:.3f},{v:g}\n'.format(x=x, y=y, v=value))
+
+
+def clip(task, cache):
+    '''clip Idf file to bounds xmin, ymin, xmax, ymax'''
+    header, array = cache.get(task.inputs[0])
+    bounds = task.options['bounds']
+    if isinstance(bounds, str):
+        bounds = [float(b) for b in bounds.split(',')]
+    clipped, clipped_header = calc.clip(array, header, bounds)
+    io.write_array(task.output, clipped.copy(), clipped_header)
+
+
+def stack(task, cache):
+    '''stack and aggregate Idf files with equal shape
+
+    Files are read in tiles of rows by calc.stack_agg, not from the cache.
+    '''
+    header = io.read_header(task.inputs[0])
+    method = task.options.get('method', 'mean')
+    kwargs = {k: task.options[k] for k in ('q', 'n', 'ddof')
+        if k in task.options}
+    result = calc.stack_agg(task.inputs, method=method,
+        tilesize=task.options.get('tilesize', idf.BLOCKSIZE),
+        workers=task.options.get('workers', 1), **kwargs)
+    io.write_array(task.output, result, header)
+
+
+OPERATIONS = {
+    'convert': convert,
+    'sample': sample,
+    'clip': clip,
+    'stack': stack,
+    }
+
+
+def make_dirs(tasks):
+    '''create parent directories of task outputs'''
+    for directory in sorted({os.path.dirname(t.output) for t in tasks}):
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+
+def run(tasks, usage, workers=None):
+    '''run tasks in a thread pool and return list of (task, error)'''
+    make_dirs(tasks)
+    cache = ArrayCache(usage)
+
+    def execute(task):
+        try:
+            logging.info('{o:} {i:} -> {f:}'.format(
+                o=task.op, i=', '.join(task.inputs), f=task.output))
+            OPERATIONS[task.op](task, cache)
+            return task, None
+        except Exception as error:
+            logging.exception('{o:} to {f:} failed'.format(
+                o=task.op, f=task.output))
+            return task, error
+        finally:
+            if task.op in PER_FILE:
+                for inputfile in task.inputs:
+                    cache.release(inputfile)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(execute, tasks))
+
+
+def run_jobs(jobs, path='.', workers=None):
+    '''plan and run jobs, return list of (task, error)'''
+    tasks, usage = plan(jobs, path=path)
+    return run(tasks, usage, workers=workers)
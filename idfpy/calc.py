@@ -2,8 +2,24 @@
 # -*- coding: utf-8 -*-
 # Tom van Steijn, Royal HaskoningDHV
 
+from idfpy import idf
+
 import numpy as np
 
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import warnings
+
+
+# reductions over a stack, nodata as NaN
+REDUCTIONS = (
+    'min', 'max', 'sum', 'mean', 'median', 'std', 'var', 'percentile',
+    'nthmax', 'nthmin', 'meanmax', 'meanmin',
+    )
+
+# reductions accumulated in double precision
+ACCUMULATING = ('sum', 'mean', 'std', 'var', 'meanmax', 'meanmin')
+
 
 def merge(m1, m2):
     '''merge two masked arrays, the first taking precedence over the second'''
@@ -22,4 +38,149 @@ def agg(*ms, method='sum', axis=-1):
         'sum': np.ma.sum,
         'mean': np.ma.mean,
         }[method](m, axis=axis)
-    return r
\ No newline at end of file
+    return r
+
+
+def _sorted_nth(values, n, axis, highest):
+    '''nth highest or lowest value along axis, NaN if fewer values'''
+    values = np.sort(values, axis=axis)  # NaN sorted last
+    count = np.sum(~np.isnan(values), axis=axis, keepdims=True)
+    if highest:
+        index = count - n
+    else:
+        index = np.broadcast_to(n - 1, count.shape)
+    is_valid = (index >= 0) & (index < count)
+    index = np.where(is_valid, index, 0)
+    nth = np.take_along_axis(values, index, axis=axis)
+    return np.squeeze(np.where(is_valid, nth, np.nan), axis=axis)
+
+
+def _sorted_mean(values, n, axis, highest):
+    '''mean of n highest or lowest values along axis'''
+    values = np.sort(values, axis=axis)  # NaN sorted last
+    count = np.sum(~np.isnan(values), axis=axis, keepdims=True)
+    rank = np.arange(values.shape[axis]).reshape(
+        [-1 if a == axis % values.ndim else 1 for a in range(values.ndim)])
+    if highest:
+        selected = (rank >= count - n) & (rank < count)
+    else:
+        selected = rank < np.minimum(n, count)
+    total = np.sum(np.where(selected, values, 0.), axis=axis)
+    number = np.sum(selected, axis=axis)
+    return np.where(number > 0, total / np.maximum(number, 1), np.nan)
+
+
+def reduce(values, method='mean', axis=0, q=50., n=1, ddof=0):
+    '''reduce array along axis ignoring NaN, NaN where no values
+
+    Methods are min, max, sum, mean, median, std, var, percentile (q in
+    0-100), nthmax and nthmin (nth highest or lowest value) and meanmax and
+    meanmin (mean of n highest or lowest values, e.g. GHG and GLG).
+    '''
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        if method == 'min':
+            return np.nanmin(values, axis=axis)
+        elif method == 'max':
+            return np.nanmax(values, axis=axis)
+        elif method == 'sum':
+            r = np.nansum(values, axis=axis)
+            return np.where(np.all(np.isnan(values), axis=axis), np.nan, r)
+        elif method == 'mean':
+            return np.nanmean(values, axis=axis)
+        elif method == 'median':
+            return np.nanmedian(values, axis=axis)
+        elif method == 'std':
+            return np.nanstd(values, axis=axis, ddof=ddof)
+        elif method == 'var':
+            return np.nanvar(values, axis=axis, ddof=ddof)
+        elif method == 'percentile':
+            return np.nanpercentile(values, q, axis=axis)
+        elif method in ('nthmax', 'nthmin'):
+            return _sorted_nth(values, n, axis, highest=method == 'nthmax')
+        elif method in ('meanmax', 'meanmin'):
+            return _sorted_mean(values, n, axis, highest=method == 'meanmax')
+    raise ValueError('method must be one of {m:}'.format(
+        m=', '.join(REDUCTIONS)))
+
+
+def stack_agg(idffiles, method='mean', tilesize=idf.BLOCKSIZE, workers=1,
+        **kwargs):
+    '''aggregate stack of Idf files in tiles of rows, return masked array
+
+    Only tilesize rows of every file are in memory per worker, so the
+    number of files is not limited by memory. Files with a shape different
+    from the first file are skipped. Keyword arguments are passed to reduce.
+    The result is double precision if any file is, sums are accumulated in
+    double precision.
+    '''
+    if method not in REDUCTIONS:
+        raise ValueError('method must be one of {m:}'.format(
+            m=', '.join(REDUCTIONS)))
+    idffiles = [str(f) for f in idffiles]
+    with idf.IdfFile(idffiles[0]) as src:
+        header = src.header
+    shape = header['nrow'], header['ncol']
+    matching = []
+    itemsizes = set()
+    for idffile in idffiles:
+        with idf.IdfFile(idffile) as src:
+            if (src.header['nrow'], src.header['ncol']) == shape:
+                matching.append(idffile)
+                itemsizes.add(src.itemsize)
+            else:
+                logging.warning('skipping {f:}, shape does not match'.format(
+                    f=idffile))
+
+    dtype = np.float64 if 8 in itemsizes else np.float32
+    if method in ACCUMULATING:
+        accumulator = np.float64
+    else:
+        accumulator = dtype
+    result = np.empty(shape, dtype=dtype)
+
+    def reduce_tile(start):
+        stop = min(start + tilesize, shape[0])
+        values = np.empty((len(matching), stop - start, shape[1]),
+            dtype=accumulator)
+        for i, idffile in enumerate(matching):
+            with idf.IdfFile(idffile) as src:
+                rows = src.read_rows(start, stop)
+                # compare nodata before conversion to accumulator dtype
+                values[i] = np.where(rows == src.header['nodata'], np.nan,
+                    rows)
+        result[start:stop] = reduce(values, method=method, axis=0, **kwargs)
+
+    starts = range(0, shape[0], tilesize)
+    if workers == 1:
+        for start in starts:
+            reduce_tile(start)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(reduce_tile, starts))
+
+    result = np.ma.masked_invalid(result)
+    result.fill_value = header['nodata']
+    return result
+
+
+def clip(m, header, bounds):
+    '''clip array to bounds xmin, ymin, xmax, ymax and return with header'''
+    if header['ieq']:
+        raise ValueError('cannot clip non-equidistant grid')
+    xmin, ymin, xmax, ymax = bounds
+    nrow, ncol = m.shape
+    col0 = max(int(np.floor((xmin - header['xmin']) / header['dx'])), 0)
+    col1 = min(int(np.ceil((xmax - header['xmin']) / header['dx'])), ncol)
+    row0 = max(int(np.floor((header['ymax'] - ymax) / header['dy'])), 0)
+    row1 = min(int(np.ceil((header['ymax'] - ymin) / header['dy'])), nrow)
+    if col1 <= col0 or row1 <= row0:
+        raise ValueError('bounds {b:} outside grid'.format(b=bounds))
+    clipped = header.copy()
+    clipped['ncol'] = col1 - col0
+    clipped['nrow'] = row1 - row0
+    clipped['xmin'] = header['xmin'] + col0 * header['dx']
+    clipped['xmax'] = header['xmin'] + col1 * header['dx']
+    clipped['ymax'] = header['ymax'] - row0 * header['dy']
+    clipped['ymin'] = header['ymax'] - row1 * header['dy']
+    return m[row0:row1, col0:col1], clipped
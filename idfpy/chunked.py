@@ -0,0 +1,124 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from idfpy import idf
+from idfpy.lazy import optional_import
+
+import numpy as np
+
+import glob
+import os
+
+
+def read_chunk(idffile, start, stop):
+    '''read rows start:stop in native byte order with NaN for nodata'''
+    with idf.IdfFile(idffile) as src:
+        values = src.read_rows(start, stop, dtype=src.native_dtype)
+        values[values == src.header['nodata']] = np.nan
+    return values
+
+
+def to_dask(idffile, chunks=idf.BLOCKSIZE):
+    '''Idf file as lazy dask array in chunks of rows, NaN for nodata
+
+    Each chunk is a contiguous byte range after the header and is read
+    when the chunk is computed. The array has the precision of the file.
+    '''
+    da = optional_import('dask.array', extra='dask')
+    dask = optional_import('dask', extra='dask')
+
+    idffile = str(idffile)
+    with idf.IdfFile(idffile) as src:
+        header = src.header
+        dtype = src.native_dtype
+    nrow, ncol = header['nrow'], header['ncol']
+
+    # include mtime in token so that changed files are not taken from cache
+    token = dask.base.tokenize(idffile, os.path.getmtime(idffile))
+    blocks = []
+    for start in range(0, nrow, chunks):
+        stop = min(start + chunks, nrow)
+        delayed = dask.delayed(read_chunk, pure=True)(idffile, start, stop,
+            dask_key_name='read-idf-{t:}-{s:d}'.format(t=token, s=start))
+        blocks.append(da.from_delayed(delayed, shape=(stop - start, ncol),
+            dtype=dtype))
+    return da.concatenate(blocks, axis=0)
+
+
+def coords(header):
+    '''xarray coordinates of Idf header'''
+    x, y = idf.cell_centers(header)
+    coords = {'y': y, 'x': x}
+    if header['ieq']:
+        coords['dx'] = ('x', np.asarray(header['dx(col)']))
+        coords['dy'] = ('y', -np.asarray(header['dy(row)']))
+    else:
+        coords['dx'] = header['dx']
+        coords['dy'] = -header['dy']
+    return coords
+
+
+def attrs(header):
+    '''xarray attributes of Idf header'''
+    attrs = {'nodata': header['nodata']}
+    if not header['ieq']:
+        attrs['transform'] = idf.geotransform(header)
+    if header['itb']:
+        attrs['top'] = header['top']
+        attrs['bot'] = header['bot']
+    return attrs
+
+
+def open_dataarray(idffile, chunks=idf.BLOCKSIZE, name=None):
+    '''Idf file as lazy xarray DataArray with x and y coordinates'''
+    xr = optional_import('xarray', extra='dask')
+
+    with idf.IdfFile(str(idffile)) as src:
+        header = src.header
+    return xr.DataArray(
+        to_dask(idffile, chunks=chunks),
+        dims=('y', 'x'),
+        coords=coords(header),
+        attrs=attrs(header),
+        name=name or os.path.splitext(os.path.basename(str(idffile)))[0],
+        )
+
+
+def open_mfdataarray(idffiles, chunks=idf.BLOCKSIZE, dim='file',
+        name=None):
+    '''Idf files (list or glob pattern) as lazy DataArray stacked along dim
+
+    All files must have the same grid.
+    '''
+    xr = optional_import('xarray', extra='dask')
+    da = optional_import('dask.array', extra='dask')
+
+    if isinstance(idffiles, str):
+        idffiles = sorted(glob.glob(idffiles))
+    idffiles = [str(f) for f in idffiles]
+    if not idffiles:
+        raise ValueError('no Idf files to open')
+
+    headers = []
+    for idffile in idffiles:
+        with idf.IdfFile(idffile) as src:
+            headers.append(src.header)
+    for idffile, header in zip(idffiles, headers):
+        if not idf.same_grid(header, headers[0]):
+            raise ValueError('grid of {f:} does not match'.format(
+                f=idffile))
+
+    stacked = da.stack([to_dask(f, chunks=chunks) for f in idffiles])
+    dacoords = coords(headers[0])
+    dacoords[dim] = [os.path.splitext(os.path.basename(f))[0]
+        for f in idffiles]
+    dims = (dim, 'y', 'x')
+    attributes = attrs(headers[0])
+    attributes.pop('top', None)
+    attributes.pop('bot', None)
+    if all(h['itb'] for h in headers):
+        dacoords['top'] = (dim, [h['top'] for h in headers])
+        dacoords['bot'] = (dim, [h['bot'] for h in headers])
+    return xr.DataArray(stacked, dims=dims, coords=dacoords,
+        attrs=attributes, name=name)
@@ -2,12 +2,14 @@
 # -*- coding: utf-8 -*-
 # Tom van Steijn, Royal HaskoningDHV
 
-from idfpy import calc
 from idfpy import io
 
 from pathlib import Path
 import click
 
+# modules depending on numpy or rasterio are imported inside the commands
+# to keep the startup time of the console scripts low
+
 
 def match_shape(idffile, desired_shape):
     '''check if the shape of idffile with is equal to desired shape'''
@@ -21,18 +23,48 @@ def match_shape(idffile, desired_shape):
 
 @click.command()
 @click.argument('pattern', type=str)
-@click.argument('method', type=click.Choice(['min', 'max', 'sum', 'mean']))
+@click.argument('method', type=click.Choice([
+    'min', 'max', 'sum', 'mean', 'median', 'std', 'var', 'percentile',
+    'nthmax', 'nthmin', 'meanmax', 'meanmin']))
 @click.argument('outfile', type=str)
-def stack(pattern, method, outfile, path='.'):
-    '''stack and aggregate idf's using min, max or mean'''
+@click.option('--q', type=float, default=50., help='Percentile (0-100)')
+@click.option('--n', type=int, default=1,
+    help='Rank for nthmax, nthmin or number of values for meanmax, meanmin')
+@click.option('--tilesize', type=int, default=256,
+    help='Number of rows read from all files at a time')
+@click.option('--workers', type=int, default=1,
+    help='Number of tiles processed in parallel')
+@click.option('--incremental', is_flag=True,
+    help='Keep aggregation state next to outfile and only process changes')
+@click.option('--hash', 'use_hash', is_flag=True,
+    help='Detect changed inputs by content hash instead of mtime and size')
+def stack(pattern, method, outfile, q, n, tilesize, workers, incremental,
+        use_hash, path='.'):
+    '''stack and aggregate idf's using min, max, mean, percentiles etc.'''
+    from idfpy import calc
+
     p = Path(path)
-    idffiles = [f for f in p.glob(pattern) if not f == outfile]
+    idffiles = sorted(f for f in p.glob(pattern)
+        if not f.resolve() == Path(outfile).resolve())
     if not len(idffiles):
         raise ValueError('no match for \'{p:}\''.format(p=pattern))
+    if incremental:
+        from idfpy import stackstate
+        if method not in stackstate.METHODS:
+            raise click.BadParameter(
+                'incremental stack supports {m:}'.format(
+                m=', '.join(stackstate.METHODS)), param_hint='method')
+        summary = stackstate.update(idffiles, outfile, method=method,
+            use_hash=use_hash)
+        click.echo('{a:d} added, {r:d} removed, {c:d} changed{f:}'.format(
+            a=len(summary['added']), r=len(summary['removed']),
+            c=len(summary['changed']),
+            f=', recomputed' if summary['recomputed'] else ''))
+        return
     header = io.read_header(idffiles[0])
-    shape = header['nrow'], header['ncol']
-    arrays = (io.read_array(f) for f in idffiles if match_shape(f, shape))
-    io.write_array(outfile, calc.agg(*arrays, method=method), header)
+    result = calc.stack_agg(idffiles, method=method, tilesize=tilesize,
+        workers=workers, q=q, n=n)
+    io.write_array(outfile, result, header)
 
 
 @click.command()
@@ -50,12 +82,263 @@ def idf2tif(pattern, epsg, path='.'):
 
 @click.command()
 @click.argument('pattern', type=str)
-@click.option('--epsg', type=int, default=28992, help='The coordinate reference system')
-def idf2asc(pattern, epsg, path='.'):
-    '''stack and aggregate idf's using min, max or mean'''
-    from idfpy import idfraster
+@click.option('--decimals', type=int, default=3, help='Number of decimals')
+@click.option('--nodata', type=float, default=None, help='Nodata value in output')
+@click.option('--epsg', type=int, default=None,
+    help='The coordinate reference system, exports with rasterio if given')
+def idf2asc(pattern, decimals, nodata, epsg, path='.'):
+    '''convert idf's to ESRI ASCII grid'''
+    from idfpy import asciigrid
 
-    p = Path(path)    
+    p = Path(path)
     for idffile in p.glob(pattern):
-        with idfraster.IdfRaster(str(idffile)) as src:
-            src.to_raster(str(idffile.with_suffix('.asc')), epsg=epsg, driver='AAIGrid')
\ No newline at end of file
+        ascfile = str(idffile.with_suffix('.asc'))
+        if epsg is None:
+            asciigrid.idf2asc(str(idffile), ascfile,
+                decimals=decimals, nodata=nodata)
+        else:
+            from idfpy import idfraster
+            with idfraster.IdfRaster(str(idffile)) as src:
+                src.to_raster(ascfile, epsg=epsg, driver='AAIGrid')
+
+
+@click.command()
+@click.argument('pattern', type=str)
+@click.option('--decimals', type=int, default=3, help='Number of decimals')
+@click.option('--delimiter', type=str, default=',', help='Column delimiter')
+@click.option('--nodata/--skip-nodata', default=False,
+    help='Include nodata cells in output')
+def idf2xyz(pattern, decimals, delimiter, nodata, path='.'):
+    '''convert idf's to XYZ text files of cell centers'''
+    from idfpy import asciigrid
+
+    p = Path(path)
+    for idffile in p.glob(pattern):
+        asciigrid.idf2xyz(str(idffile), str(idffile.with_suffix('.csv')),
+            decimals=decimals, delimiter=delimiter, skip_nodata=not nodata)
+
+
+@click.command()
+@click.argument('pattern', type=str)
+@click.option('--host', type=str, default='127.0.0.1', help='Host to bind')
+@click.option('--port', type=int, default=8000, help='Port to bind')
+@click.option('--cache-mb', type=int, default=256,
+    help='Tile cache size in megabytes')
+@click.option('--workers', type=int, default=None,
+    help='Number of threads rendering tiles')
+def idfserve(pattern, host, port, cache_mb, workers, path='.'):
+    '''serve idf's as PNG or raw float32 tiles'''
+    from idfpy import serve
+
+    p = Path(path)
+    idffiles = sorted(str(f) for f in p.glob(pattern))
+    if not len(idffiles):
+        raise ValueError('no match for \'{p:}\''.format(p=pattern))
+    server = serve.TileServer(idffiles, cache_bytes=cache_mb * 2**20,
+        workers=workers)
+    click.echo('serving {n:d} layers on http://{h:}:{p:d}/layers'.format(
+        n=len(server.layers), h=host, p=port))
+    server.serve_forever(host=host, port=port)
+
+
+@click.command()
+@click.argument('a', type=click.Path(exists=True))
+@click.argument('b', type=click.Path(exists=True))
+@click.option('--atol', type=float, default=0., help='Absolute tolerance')
+@click.option('--rtol', type=float, default=0., help='Relative tolerance')
+@click.option('--quick', is_flag=True,
+    help='Stop at the first difference')
+@click.option('--out', type=str, default=None,
+    help='Write difference a - b to this idf (files only)')
+@click.option('--pattern', type=str, default='*.idf',
+    help='Files compared when a and b are directories')
+@click.option('--workers', type=int, default=None,
+    help='Number of files compared in parallel')
+def idfdiff(a, b, atol, rtol, quick, out, pattern, workers):
+    '''compare two idf's or directories of idf's, exit 1 if different'''
+    from idfpy import diff
+
+    if Path(a).is_dir() and Path(b).is_dir():
+        results = diff.diff_dirs(a, b, pattern=pattern, workers=workers,
+            atol=atol, rtol=rtol, quick=quick)
+    else:
+        results = {Path(a).name: diff.diff(a, b, atol=atol, rtol=rtol,
+            quick=quick, outfile=out)}
+    different = False
+    for name, result in sorted(results.items()):
+        if result is None:
+            click.echo('{n:}: only in one directory'.format(n=name))
+            different = True
+            continue
+        for key, (value_a, value_b) in result['header'].items():
+            if key in ('dx(col)', 'dy(row)'):
+                value_a, value_b = '...', '...'
+            click.echo('{n:}: header {k:} {a:} != {b:}'.format(
+                n=name, k=key, a=value_a, b=value_b))
+            if key not in ('dmin', 'dmax'):
+                different = True
+        if result['equal']:
+            continue
+        different = True
+        click.echo(('{n:}: {c:d} cells changed{p:}, {d:d} nodata changed, '
+            'max abs diff {m:g}, bounds {b:}').format(
+            n=name, c=result['nchanged'], d=result['nodata_changed'],
+            m=result['max_abs_diff'], b=result['bounds'],
+            p=' (or more)' if not result['complete'] else ''))
+    if different:
+        raise SystemExit(1)
+
+
+@click.group()
+def main():
+    '''process Idf files'''
+
+
+@main.command(name='batch')
+@click.argument('jobfile', type=click.Path(exists=True))
+@click.option('--workers', type=int, default=None,
+    help='Number of worker threads')
+@click.option('--path', type=str, default='.',
+    help='Directory in which input patterns are matched')
+def run_batch(jobfile, workers, path):
+    '''run convert, stack, sample and clip jobs from a job file'''
+    from idfpy import batch
+
+    jobs = batch.read_jobs(jobfile)
+    results = batch.run_jobs(jobs, path=path, workers=workers)
+    failed = [task for task, error in results if error is not None]
+    click.echo('{n:d} tasks done, {f:d} failed'.format(
+        n=len(results) - len(failed), f=len(failed)))
+    if failed:
+        raise click.ClickException('failed: {f:}'.format(
+            f=', '.join(t.output for t in failed)))
+
+
+@main.command(name='overviews')
+@click.argument('pattern', type=str)
+@click.option('--factors', type=str, default='2,4,8,16,32',
+    help='Comma separated overview factors')
+@click.option('--method', type=click.Choice(['mean', 'nearest', 'min', 'max']),
+    default='mean', help='Method to aggregate cells')
+def build_overviews(pattern, factors, method, path='.'):
+    '''build overview sidecars for fast zoomed-out reads'''
+    from idfpy import overview
+
+    factors = [int(f) for f in factors.split(',')]
+    p = Path(path)
+    for idffile in p.glob(pattern):
+        overview.build_overviews(str(idffile), factors=factors, method=method)
+
+
+@main.command(name='tilebench')
+@click.option('--host', type=str, default='127.0.0.1', help='Server host')
+@click.option('--port', type=int, default=8000, help='Server port')
+@click.option('--zoom', type=int, default=3, help='Highest zoom level')
+@click.option('--fmt', type=click.Choice(['png', 'f32']), default='png',
+    help='Tile format')
+@click.option('--concurrency', type=int, default=8,
+    help='Number of concurrent connections')
+@click.option('--repeat', type=int, default=1,
+    help='Number of times every tile is requested')
+def tilebench(host, port, zoom, fmt, concurrency, repeat):
+    '''load test a running idfserve with all tiles up to zoom'''
+    from idfpy import serve
+    from urllib.request import urlopen
+    import json
+
+    url = 'http://{h:}:{p:d}/layers'.format(h=host, p=port)
+    with urlopen(url) as response:
+        layers = json.loads(response.read().decode())['layers']
+    paths = serve.tile_paths(layers, range(zoom + 1), fmt=fmt) * repeat
+    result = serve.benchmark(paths, host=host, port=port,
+        concurrency=concurrency)
+    for key, value in result.items():
+        click.echo('{k:}: {v:}'.format(k=key, v=value))
+
+
+@main.command(name='focal')
+@click.argument('infile', type=click.Path(exists=True))
+@click.argument('operator', type=click.Choice([
+    'mean', 'sum', 'count', 'max', 'min',
+    'dzdx', 'dzdy', 'slope', 'aspect', 'laplacian']))
+@click.argument('outfile', type=str)
+@click.option('--size', type=int, default=3, help='Moving window size (odd)')
+@click.option('--fill', is_flag=True, help='Fill nodata cells from window')
+@click.option('--blocksize', type=int, default=256,
+    help='Number of rows per block')
+@click.option('--workers', type=int, default=1,
+    help='Number of blocks processed in parallel')
+def run_focal(infile, operator, outfile, size, fill, blocksize, workers):
+    '''apply moving window or gradient operator to an idf'''
+    from idfpy import focal
+
+    focal.apply(infile, outfile, operator=operator, size=size, fill=fill,
+        blocksize=blocksize, workers=workers)
+
+
+@main.command(name='stats')
+@click.argument('pattern', type=str)
+@click.option('--fraction', type=float, default=None,
+    help='Approximate from this fraction of rows instead of all rows')
+@click.option('--method', type=click.Choice(['strided', 'random']),
+    default='strided', help='Sample evenly spaced or random rows')
+@click.option('--refresh', is_flag=True,
+    help='Write exact dmin and dmax to the header')
+@click.option('--workers', type=int, default=None,
+    help='Number of files processed in parallel')
+def run_stats(pattern, fraction, method, refresh, workers, path='.'):
+    '''print statistics of idf's, exact or from a fraction of rows'''
+    from idfpy import stats
+
+    if refresh and fraction is not None:
+        raise click.BadParameter('refresh needs exact statistics',
+            param_hint='--refresh')
+    p = Path(path)
+    idffiles = sorted(str(f) for f in p.glob(pattern))
+    kwargs = {'refresh': refresh}
+    if fraction is not None:
+        kwargs = {'method': method}
+    results = stats.describe_files(idffiles, fraction=fraction,
+        workers=workers, **kwargs)
+    for idffile, result in results.items():
+        line = ('{f:}: count {r[count]:d}, nodata {r[nodata]:d}, '
+            'min {r[min]:g}, max {r[max]:g}, mean {r[mean]:g}').format(
+            f=idffile, r=result)
+        if fraction is not None:
+            line += ' +/- {e:g}'.format(e=result['mean_error'])
+        line += ', std {s:g}, p50 {p:g}'.format(s=result['std'],
+            p=result.get('percentiles', {}).get(50., float('nan')))
+        click.echo(line)
+
+
+@main.command(name='rasterize')
+@click.argument('geojsonfile', type=click.Path(exists=True))
+@click.argument('template', type=click.Path(exists=True))
+@click.argument('outfile', type=str)
+@click.option('--attribute', type=str, default=None,
+    help='Feature property burned as value, 1 if not given')
+@click.option('--mode', type=click.Choice(['centroid', 'all_touched',
+    'fraction']), default='centroid', help='Cells burned by polygons')
+@click.option('--supersample', type=int, default=4,
+    help='Subcells per cell side in fraction mode')
+def run_rasterize(geojsonfile, template, outfile, attribute, mode,
+        supersample):
+    '''burn GeoJSON features onto the grid of a template idf'''
+    from idfpy import rasterize
+    import json
+
+    with open(geojsonfile) as f:
+        features = json.load(f)['features']
+    if attribute is None:
+        shapes = features
+    else:
+        shapes = [(f, f['properties'][attribute]) for f in features]
+    rasterize.rasterize_idf(shapes, outfile, template, mode=mode,
+        supersample=supersample)
+
+
+main.add_command(stack, name='stack')
+main.add_command(idf2tif, name='idf2tif')
+main.add_command(idf2asc, name='idf2asc')
+main.add_command(idf2xyz, name='idf2xyz')
+main.add_command(idfdiff, name='diff')
@@ -0,0 +1,178 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from idfpy import idf
+
+import numpy as np
+
+from concurrent.futures import ThreadPoolExecutor
+import glob
+import os
+
+
+# header fields describing the grid, data can only be compared if equal
+GRID_FIELDS = ('ncol', 'nrow')
+
+# header fields locating the grid, files are not equal if these differ
+GEO_FIELDS = ('xmin', 'ymin', 'xmax', 'ymax', 'dx', 'dy', 'ieq',
+    'dx(col)', 'dy(row)', 'itb', 'top', 'bot')
+
+
+def diff_header(header_a, header_b):
+    '''dict of header fields that differ with values in a and b'''
+    keys = sorted(set(header_a) | set(header_b))
+    return {k: (header_a.get(k), header_b.get(k)) for k in keys
+        if header_a.get(k) != header_b.get(k)}
+
+
+def diff(idffile_a, idffile_b, atol=0., rtol=0., quick=False,
+        blocksize=idf.BLOCKSIZE, outfile=None):
+    '''compare two Idf files, headers first and then data in blocks
+
+    Files with different georeferencing (GEO_FIELDS) are not equal. Data
+    blocks that are bitwise identical are skipped without any arithmetic.
+    Cells differ if nodata in only one file or if |a - b| > atol +
+    rtol * |b|. With quick=True comparison stops at the first differing
+    block, so counts and bounds are incomplete. If outfile is given, a - b
+    is written to it block by block.
+
+    Returns dict with keys header (differing fields), equal, identical,
+    complete, max_abs_diff, nchanged, nodata_changed, bbox (row, col
+    ranges of changed cells) and bounds (xmin, ymin, xmax, ymax).
+    '''
+    result = {
+        'header': {},
+        'equal': True,
+        'identical': True,
+        'complete': True,
+        'max_abs_diff': 0.,
+        'nchanged': 0,
+        'nodata_changed': 0,
+        'bbox': None,
+        'bounds': None,
+        }
+    with idf.IdfFile(str(idffile_a)) as a, idf.IdfFile(str(idffile_b)) as b:
+        result['header'] = diff_header(a.header, b.header)
+        if any(a.header[k] != b.header[k] for k in GRID_FIELDS):
+            result.update(equal=False, identical=False, complete=False)
+            return result
+        # value range fields follow from data and are not a difference
+        if set(result['header']) - {'dmin', 'dmax'}:
+            result['identical'] = False
+        if set(result['header']) & set(GEO_FIELDS):
+            result['equal'] = False
+
+        dst = None
+        if outfile is not None:
+            header = a.header.copy()
+            dst = idf.IdfFile(str(outfile), 'wb', header)
+        rows, cols = [], []
+        dmin, dmax = np.inf, -np.inf
+        try:
+            for start in range(0, a.header['nrow'], blocksize):
+                stop = start + blocksize
+                values_a = a.read_rows(start, stop)
+                values_b = b.read_rows(start, stop)
+                is_nodata_a = values_a == a.header['nodata']
+                is_nodata_b = values_b == b.header['nodata']
+
+                identical = (values_a.dtype == values_b.dtype and
+                    np.array_equal(values_a.view(np.uint8),
+                    values_b.view(np.uint8)))
+                if identical and a.header['nodata'] == b.header['nodata']:
+                    if dst is not None:
+                        zeros = np.where(is_nodata_a, header['nodata'], 0.)
+                        if not np.all(is_nodata_a):
+                            dmin, dmax = min(dmin, 0.), max(dmax, 0.)
+                        dst.write_rows(zeros, start)
+                    continue
+
+                # compare values where both have data
+                result['identical'] = False
+                is_valid = ~is_nodata_a & ~is_nodata_b
+                with np.errstate(invalid='ignore'):
+                    difference = np.where(is_valid,
+                        values_a.astype(np.float64) - values_b, 0.)
+                    absdiff = np.abs(difference)
+                    changed = absdiff > atol + rtol * np.abs(values_b)
+                nodata_changed = is_nodata_a != is_nodata_b
+                changed |= nodata_changed
+
+                if np.any(is_valid):
+                    result['max_abs_diff'] = max(result['max_abs_diff'],
+                        float(absdiff[is_valid].max()))
+                result['nchanged'] += int(changed.sum())
+                result['nodata_changed'] += int(nodata_changed.sum())
+                if np.any(changed):
+                    result['equal'] = False
+                    changed_rows, changed_cols = np.nonzero(changed)
+                    rows.extend([start + changed_rows.min(),
+                        start + changed_rows.max()])
+                    cols.extend([changed_cols.min(), changed_cols.max()])
+
+                if dst is not None:
+                    if np.any(is_valid):
+                        dmin = min(dmin, difference[is_valid].min())
+                        dmax = max(dmax, difference[is_valid].max())
+                    difference[~is_valid] = header['nodata']
+                    dst.write_rows(difference, start)
+
+                if quick and not result['equal']:
+                    result['complete'] = False
+                    break
+            if dst is not None:
+                if np.isfinite(dmin):
+                    dst.header['dmin'], dst.header['dmax'] = dmin, dmax
+                dst.write_header()
+        finally:
+            if dst is not None:
+                dst.close()
+
+        if rows:
+            result['bbox'] = (int(min(rows)), int(max(rows)) + 1,
+                int(min(cols)), int(max(cols)) + 1)
+            result['bounds'] = bbox_bounds(a.header, result['bbox'])
+    return result
+
+
+def bbox_bounds(header, bbox):
+    '''xmin, ymin, xmax, ymax of row and column range row0, row1, col0, col1'''
+    row0, row1, col0, col1 = bbox
+    xedges, yedges = idf.cell_edges(header)
+    return (
+        float(xedges[col0]),
+        float(yedges[row1]),
+        float(xedges[col1]),
+        float(yedges[row0]),
+        )
+
+
+def is_equal(idffile_a, idffile_b, atol=0., rtol=0.):
+    '''True if Idf files have equal grid and data within tolerance'''
+    return diff(idffile_a, idffile_b, atol=atol, rtol=rtol,
+        quick=True)['equal']
+
+
+def diff_dirs(dir_a, dir_b, pattern='*.idf', workers=None, **kwargs):
+    '''compare Idf files matching pattern in two directories in parallel
+
+    Returns dict of relative filename and result of diff, or None for
+    files in only one of the directories.
+    '''
+    def relative(directory):
+        return {os.path.relpath(f, directory)
+            for f in glob.glob(os.path.join(directory, pattern))}
+
+    files_a, files_b = relative(dir_a), relative(dir_b)
+    common = sorted(files_a & files_b)
+
+    def compare(name):
+        return diff(os.path.join(dir_a, name), os.path.join(dir_b, name),
+            **kwargs)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = dict(zip(common, executor.map(compare, common)))
+    for name in sorted(files_a ^ files_b):
+        results[name] = None
+    return results
@@ -0,0 +1,202 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from idfpy import idf
+
+import numpy as np
+
+from concurrent.futures import ThreadPoolExecutor
+import warnings
+
+
+def gradient(values, x, y):
+    '''dz/dx and dz/dy of values at cell centers x, y, NaN for nodata
+
+    Central differences for (non-)equidistant cells, one-sided at edges.
+    '''
+    if values.shape[0] < 2:
+        return np.full(values.shape, np.nan), np.full(values.shape, np.nan)
+    dzdy, dzdx = np.gradient(values.astype(np.float64), y, x)
+    return dzdx, dzdy
+
+
+def dzdx(values, x, y):
+    '''dz/dx of values'''
+    return gradient(values, x, y)[0]
+
+
+def dzdy(values, x, y):
+    '''dz/dy of values'''
+    return gradient(values, x, y)[1]
+
+
+def slope(values, x, y):
+    '''slope in degrees'''
+    gx, gy = gradient(values, x, y)
+    return np.degrees(np.arctan(np.hypot(gx, gy)))
+
+
+def aspect(values, x, y):
+    '''direction of steepest descent in degrees clockwise from north'''
+    gx, gy = gradient(values, x, y)
+    direction = np.degrees(np.arctan2(-gx, -gy)) % 360.
+    direction[(gx == 0.) & (gy == 0.)] = np.nan
+    return direction
+
+
+def _second_derivative(values, coords, axis):
+    '''second derivative along axis for non-uniform coords, NaN at edges'''
+    values = np.moveaxis(values, axis, 0)
+    h = np.diff(coords)
+    result = np.full(values.shape, np.nan)
+    if len(coords) > 2:
+        hm = h[:-1].reshape(-1, *[1] * (values.ndim - 1))
+        hp = h[1:].reshape(-1, *[1] * (values.ndim - 1))
+        result[1:-1] = 2. * (
+            (values[2:] - values[1:-1]) / hp -
+            (values[1:-1] - values[:-2]) / hm
+            ) / (hp + hm)
+    return np.moveaxis(result, 0, axis)
+
+
+def laplacian(values, x, y):
+    '''d2z/dx2 + d2z/dy2 of values, NaN at edges and next to nodata'''
+    values = values.astype(np.float64)
+    return (_second_derivative(values, x, axis=1) +
+        _second_derivative(values, y, axis=0))
+
+
+def box_sum(values, size):
+    '''sum over size x size window of every cell using summed-area table
+
+    Cells outside the array count as zero.
+    '''
+    half = size // 2
+    padded = np.pad(values.astype(np.float64), half)
+    sat = np.zeros((padded.shape[0] + 1, padded.shape[1] + 1))
+    np.cumsum(padded, axis=0, out=sat[1:, 1:])
+    np.cumsum(sat[1:, 1:], axis=1, out=sat[1:, 1:])
+    return (sat[size:, size:] - sat[:-size, size:] -
+        sat[size:, :-size] + sat[:-size, :-size])
+
+
+def _window_extreme(values, size, func, fill):
+    '''separable moving window max or min, NaN for nodata'''
+    half = size // 2
+    filled = np.where(np.isnan(values), fill, values)
+    padded = np.pad(filled, half, constant_values=fill)
+    windows = np.lib.stride_tricks.sliding_window_view(padded, size, axis=1)
+    reduced = func(windows, axis=-1)
+    windows = np.lib.stride_tricks.sliding_window_view(reduced, size, axis=0)
+    reduced = func(windows, axis=-1)
+    reduced[reduced == fill] = np.nan
+    return reduced
+
+
+def moving_window(values, size=3, method='mean', fill=False):
+    '''moving window mean, sum, count, max or min over size x size cells
+
+    Nodata (NaN) cells are ignored. Cells that are nodata remain nodata
+    unless fill is True. Window sums use a summed-area table, so the cost
+    per cell does not depend on size.
+    '''
+    if size < 1 or not size % 2:
+        raise ValueError('window size must be a positive odd number')
+    is_nan = np.isnan(values)
+    if method in ('mean', 'sum', 'count'):
+        count = box_sum(~is_nan, size)
+        if method == 'count':
+            result = count
+        else:
+            result = box_sum(np.where(is_nan, 0., values), size)
+            if method == 'mean':
+                with warnings.catch_warnings():
+                    warnings.simplefilter('ignore', RuntimeWarning)
+                    result = result / count
+            result[count == 0] = np.nan
+    elif method == 'max':
+        result = _window_extreme(values, size, np.max, -np.inf)
+    elif method == 'min':
+        result = _window_extreme(values, size, np.min, np.inf)
+    else:
+        raise ValueError('unknown method \'{m:}\''.format(m=method))
+    if not fill:
+        result[is_nan] = np.nan
+    return result
+
+
+# operator name, function and number of halo rows needed
+OPERATORS = {
+    'dzdx': (dzdx, lambda size: 1),
+    'dzdy': (dzdy, lambda size: 1),
+    'slope': (slope, lambda size: 1),
+    'aspect': (aspect, lambda size: 1),
+    'laplacian': (laplacian, lambda size: 1),
+    'mean': (None, lambda size: size // 2),
+    'sum': (None, lambda size: size // 2),
+    'count': (None, lambda size: size // 2),
+    'max': (None, lambda size: size // 2),
+    'min': (None, lambda size: size // 2),
+    }
+
+
+def focal(values, x, y, operator='mean', size=3, fill=False):
+    '''apply focal operator to array with NaN for nodata'''
+    func, _ = OPERATORS[operator]
+    if func is None:
+        return moving_window(values, size=size, method=operator, fill=fill)
+    return func(values, x, y)
+
+
+def read_halo_block(idffile, start, stop, halo):
+    '''read rows start:stop with halo rows, return values and halo above'''
+    with idf.IdfFile(idffile) as src:
+        first = max(start - halo, 0)
+        values = src.read_rows(first, stop + halo, dtype=src.native_dtype)
+        values[values == src.header['nodata']] = np.nan
+    return values, start - first
+
+
+def apply(idffile, outfile, operator='mean', size=3, fill=False,
+        blocksize=idf.BLOCKSIZE, workers=1):
+    '''apply focal operator to Idf file in blocks of rows, write outfile
+
+    Every block is read with the halo rows its operator needs from the
+    adjacent blocks, so results are equal to processing the whole grid.
+    Blocks are processed in parallel if workers > 1.
+    '''
+    if operator not in OPERATORS:
+        raise ValueError('unknown operator \'{o:}\''.format(o=operator))
+    idffile = str(idffile)
+    with idf.IdfFile(idffile) as src:
+        header = src.header.copy()
+    x, y = idf.cell_centers(header)
+    halo = OPERATORS[operator][1](size)
+    nrow = header['nrow']
+
+    def process(start):
+        stop = min(start + blocksize, nrow)
+        values, above = read_halo_block(idffile, start, stop, halo)
+        first = start - above
+        result = focal(values, x, y[first:first + values.shape[0]],
+            operator=operator, size=size, fill=fill)
+        return start, result[above:above + stop - start]
+
+    starts = list(range(0, nrow, blocksize))
+    dmin, dmax = np.inf, -np.inf
+    with idf.IdfFile(str(outfile), 'wb', header) as dst, \
+            ThreadPoolExecutor(max_workers=workers) as executor:
+        # submit at most 2 blocks per worker ahead to bound memory
+        step = max(workers, 1) * 2
+        for i in range(0, len(starts), step):
+            for start, result in executor.map(process, starts[i:i + step]):
+                is_valid = ~np.isnan(result)
+                if np.any(is_valid):
+                    dmin = min(dmin, result[is_valid].min())
+                    dmax = max(dmax, result[is_valid].max())
+                result[~is_valid] = header['nodata']
+                dst.write_rows(result, start)
+        if np.isfinite(dmin):
+            dst.header['dmin'], dst.header['dmax'] = dmin, dmax
+        dst.write_header()
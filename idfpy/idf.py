@@ -2,14 +2,112 @@
 # -*- coding: utf-8 -*-
 # Tom van Steijn, Royal HaskoningDHV
 
-import numpy as np
-
 import logging
 import struct
+import sys
+
+# numpy is imported inside the functions and methods that read or write
+# data, header-only operations do not need it
+
+
+# default number of rows per block for blockwise reading and writing
+BLOCKSIZE = 256
+
+# lahey record markers of single (4 byte) and double (8 byte) precision files
+LAHEY = {4: (1271,), 8: (2295, 2296)}
+
+NATIVE_BYTEORDER = '<' if sys.byteorder == 'little' else '>'
+
+# file modes, 'r+b' updates an existing file in place
+READ_MODES = ('rb', 'r+b')
+WRITE_MODES = ('wb', 'r+b')
+
+# header fields that must be equal for files on the same grid, cell sizes
+# are compared separately for equidistant and non-equidistant grids
+GRID_FIELDS = ('ncol', 'nrow', 'xmin', 'ymax', 'ieq')
+
+
+def cell_centers(header):
+    '''x coordinates of column centers and y coordinates of row centers'''
+    import numpy as np
+
+    if header['ieq']:
+        dx = np.asarray(header['dx(col)'], dtype=np.float64)
+        dy = np.asarray(header['dy(row)'], dtype=np.float64)
+        x = header['xmin'] + np.cumsum(dx) - dx / 2.
+        y = header['ymax'] - np.cumsum(dy) + dy / 2.
+    else:
+        x = header['xmin'] + (np.arange(header['ncol']) + 0.5) * header['dx']
+        y = header['ymax'] - (np.arange(header['nrow']) + 0.5) * header['dy']
+    return x, y
+
+
+def cell_edges(header):
+    '''x coordinates of column edges and y coordinates of row edges'''
+    import numpy as np
+
+    if header['ieq']:
+        dx = np.asarray(header['dx(col)'], dtype=np.float64)
+        dy = np.asarray(header['dy(row)'], dtype=np.float64)
+    else:
+        dx = np.full(header['ncol'], header['dx'], dtype=np.float64)
+        dy = np.full(header['nrow'], header['dy'], dtype=np.float64)
+    x = header['xmin'] + np.concatenate([[0.], np.cumsum(dx)])
+    y = header['ymax'] - np.concatenate([[0.], np.cumsum(dy)])
+    return x, y
+
+
+def cell_indices(header, x, y):
+    '''row and column indices of coordinates x, y and mask of valid cells'''
+    import numpy as np
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if header['ieq']:
+        xedges = header['xmin'] + np.cumsum(header['dx(col)'])
+        yedges = header['ymax'] - np.cumsum(header['dy(row)'])
+        col = np.searchsorted(xedges, x, side='right')
+        row = np.searchsorted(-yedges, -y, side='right')
+    else:
+        col = np.floor((x - header['xmin']) / header['dx']).astype(np.int64)
+        row = np.floor((header['ymax'] - y) / header['dy']).astype(np.int64)
+    is_valid = (
+        (x >= header['xmin']) & (y <= header['ymax']) &
+        (col >= 0) & (col < header['ncol']) &
+        (row >= 0) & (row < header['nrow'])
+        )
+    return row, col, is_valid
+
+
+def geotransform(header):
+    '''GDAL style geotransform from Idf header'''
+    return (
+        header['xmin'],
+        header['dx'],
+        0.,
+        header['ymax'],
+        0.,
+        -header['dy'],
+        )
+
+
+def same_grid(header_a, header_b):
+    '''True if headers describe the same grid, including cell sizes'''
+    if any(header_a[k] != header_b[k] for k in GRID_FIELDS):
+        return False
+    if header_a['ieq']:
+        return all(tuple(header_a[k]) == tuple(header_b[k])
+            for k in ('dx(col)', 'dy(row)'))
+    return header_a['dx'] == header_b['dx'] and header_a['dy'] == header_b['dy']
 
 
 class IdfFileHeaderFormat(object):
-    """Static class containing Idf file header definition"""
+    """Static class containing Idf file header definition
+
+    Double precision files have 8 byte records: lahey is followed by 4 pad
+    bytes, ncol and nrow are 8 byte integers, reals are 8 byte floats and
+    the flags are padded to 8 bytes.
+    """
     fields = [
         ('lahey', 'i'),
         ('ncol', 'i'),
@@ -33,20 +131,71 @@ class IdfFileHeaderFormat(object):
     byteformat = ''.join(f for n, f in fields) + pad_bytes*'x'
     length = struct.calcsize(byteformat)
 
+    double_byteformat = 'i4xqqddddddd???5x'
+    double_length = struct.calcsize('=' + double_byteformat)
+
+    @classmethod
+    def get_byteformat(cls, itemsize=4, byteorder='='):
+        """struct format of header for itemsize 4 or 8 and byte order"""
+        if itemsize == 8:
+            return byteorder + cls.double_byteformat
+        return byteorder + cls.byteformat
+
+
+def detect_format(record):
+    '''itemsize and byte order of Idf file from lahey record marker'''
+    for byteorder in ('<', '>'):
+        lahey, = struct.unpack(byteorder + 'i', record)
+        for itemsize, markers in LAHEY.items():
+            if lahey in markers:
+                return itemsize, byteorder
+    logging.warning('unknown lahey record marker, assuming single precision')
+    return 4, NATIVE_BYTEORDER
+
+
+def is_filelike(obj):
+    '''True if obj is a seekable file-like object rather than a path'''
+    return hasattr(obj, 'seek') and (
+        hasattr(obj, 'read') or hasattr(obj, 'write'))
+
 
 class IdfFile(object):
-    """iMOD Idf file read and write object"""
-    def __init__(self, filepath, mode='rb', header=None):
+    """iMOD Idf file read and write object
+
+    filepath is a path or a seekable binary file-like object, such as an
+    open file, io.BytesIO, mmap or a member of an archive. File-like
+    objects are only closed with the IdfFile if closefd is True.
+
+    Precision and byte order are detected from the file when reading. When
+    writing, dtype sets precision and byte order (e.g. '>f8'), otherwise
+    precision follows the lahey record marker of the header.
+    """
+    def __init__(self, filepath, mode='rb', header=None, dtype=None,
+            closefd=False):
         # set filepath as property
         self.filepath = filepath
+        self.closefd = closefd
 
         # open filehandle
         self.open(mode=mode)
 
+        # set data itemsize and byte order, updated when reading header
+        self.itemsize, self.byteorder = 4, NATIVE_BYTEORDER
+        if dtype is not None:
+            import numpy as np
+            dtype = np.dtype(dtype)
+            if dtype.kind != 'f' or dtype.itemsize not in LAHEY:
+                raise ValueError('dtype must be float32 or float64')
+            self.itemsize = dtype.itemsize
+            if dtype.byteorder in '<>':
+                self.byteorder = dtype.byteorder
+        elif header is not None and header.get('lahey') in LAHEY[8]:
+            self.itemsize = 8
+
         # set header or read from file
         if header is not None:
             self.header = header
-        elif self.mode == 'rb':
+        elif self.mode in READ_MODES:
             self.header = self.read_header()
         else:
             self.header = {}  # no header, empty dict
@@ -76,29 +225,43 @@ class IdfFile(object):
 
     @property
     def closed(self):
-        return self.f.closed
+        return self._closed or getattr(self.f, 'closed', False)
 
     @property
     def mode(self):
-        return self.f.mode
+        return self._mode
+
+    @property
+    def dtype(self):
+        """numpy dtype of data in file"""
+        import numpy as np
+
+        return np.dtype('{b:}f{i:d}'.format(b=self.byteorder, i=self.itemsize))
+
+    @property
+    def native_dtype(self):
+        """numpy dtype of data in file in native byte order"""
+        return self.dtype.newbyteorder('=')
+
+    @property
+    def realformat(self):
+        """struct format character of reals in file"""
+        return 'd' if self.itemsize == 8 else 'f'
 
     @property
     def irec(self):
-        return (10 + (not self.header['ieq']) * 2 + self.header['ieq'] * 2
-            + self.header['itb'] * 2 + 1) * 4
+        header_length = struct.calcsize(
+            IdfFileHeaderFormat.get_byteformat(self.itemsize))
+        return header_length + self.itemsize * (
+            (not self.header['ieq']) * 2
+            + self.header['ieq'] * (self.header['ncol'] + self.header['nrow'])
+            + self.header['itb'] * 2)
 
     @property
     def geotransform(self):
         """GDAL style geotransform for use with GIS packages"""
         if self.header is not None:
-            return (
-                self.header['xmin'],
-                self.header['dx'],
-                0.,
-                self.header['ymax'],
-                0.,
-                -self.header['dy'],
-                )
+            return geotransform(self.header)
 
     @property
     def data(self):
@@ -113,12 +276,21 @@ class IdfFile(object):
         return self._masked_data
 
     def open(self, mode='rb'):
-        """open file handle"""
-        self.f = open(self.filepath, mode)
+        """open file handle, or use filepath if it is a file-like object"""
+        if is_filelike(self.filepath):
+            self.f = self.filepath
+            self._owns_file = self.closefd
+        else:
+            self.f = open(self.filepath, mode)
+            self._owns_file = True
+        self._mode = mode
+        self._closed = False
 
     def close(self):
-        """close file handle"""
-        self.f.close()
+        """close file handle if opened by this instance"""
+        if self._owns_file:
+            self.f.close()
+        self._closed = True
 
     def copy(self, filepath=None, mode=None, header=None):
         """return new instance with copy of header"""
@@ -126,11 +298,12 @@ class IdfFile(object):
             filepath=filepath or self.filepath,
             mode=mode or self.mode,
             header=header or self.header.copy(),
+            dtype=self.dtype,
             )
 
     def check_read(self):
         """check if reading from file is ok"""
-        if self.mode != 'rb':
+        if self.mode not in READ_MODES:
             raise ValueError("cannot read in '{}' mode".format(self.mode))
         if self.closed:
             raise IOError('cannot read closed Idf file')
@@ -141,58 +314,159 @@ class IdfFile(object):
         if not is_checked:
             self.check_read()
 
-        # set file back to first byte
+        # detect precision and byte order from lahey record marker
         self.f.seek(0)
+        self.itemsize, self.byteorder = detect_format(self.f.read(4))
 
         # read values according to headerformat and save in dict
-        header_values = struct.unpack(
-            IdfFileHeaderFormat.byteformat,
-            self.f.read(IdfFileHeaderFormat.length),
-            )
+        self.f.seek(0)
+        byteformat = IdfFileHeaderFormat.get_byteformat(self.itemsize,
+            self.byteorder)
+        header_values = struct.unpack(byteformat,
+            self.f.read(struct.calcsize(byteformat)))
         header = {n: v
             for n, v in zip(IdfFileHeaderFormat.names, header_values)
             }
 
         # read conditional values from header
+        b, r, n = self.byteorder, self.realformat, self.itemsize
         if not header['ieq']:
-            header['dx'], header['dy'] = struct.unpack('2f',
-                self.f.read(4*2))
+            header['dx'], header['dy'] = struct.unpack(b + 2*r,
+                self.f.read(n*2))
         if header['itb']:
-            header['top'], header['bot'] = struct.unpack('2f',
-                self.f.read(4*2))
+            header['top'], header['bot'] = struct.unpack(b + 2*r,
+                self.f.read(n*2))
         if header['ieq']:
-            header['dx(col)'] = struct.unpack('f'*header['ncol'],
-                self.f.read(4*header['ncol']))
-            header['dy(row)'] = struct.unpack('f'*header['nrow'],
-                self.f.read(4*header['nrow']))
+            header['dx(col)'] = struct.unpack(b + r*header['ncol'],
+                self.f.read(n*header['ncol']))
+            header['dy(row)'] = struct.unpack(b + r*header['nrow'],
+                self.f.read(n*header['nrow']))
         return header
 
-    def read(self, masked=False):
-        """read values from Idf file and return data as (masked) array"""
+    def read(self, masked=False, out_shape=None, dtype=None):
+        """read values from Idf file and return data as (masked) array
+
+        Values are returned with the precision and byte order of the file
+        unless dtype is given. If out_shape is given, data is resampled to
+        out_shape using the closest overview sidecar if available, see
+        idfpy.overview.
+        """
+        import numpy as np
+
         is_checked = self.check_read()
 
         # read header if possible
         if not self.header:
             self.header = self.read_header(is_checked=is_checked)
 
+        # read from overview
+        if out_shape is not None:
+            from idfpy import overview
+            return overview.read(self, out_shape, masked=masked,
+                dtype=dtype)
+
         # set file to start of data
         self.f.seek(self.irec)
 
         # read values
-        values = np.fromfile(self.f, np.float32,
-            self.header['nrow']*self.header['ncol'])
+        values = self.read_values(self.header['nrow']*self.header['ncol'])
 
         # reshape values to array shape(nrow, ncol)
         values = values.reshape(self.header['nrow'], self.header['ncol'])
+        if dtype is not None:
+            values = values.astype(dtype, copy=False)
+
+        if masked:
+            return np.ma.masked_values(values, self.header['nodata'])
+        else:
+            return values
+
+    def read_rows(self, start, stop, masked=False, dtype=None):
+        """read block of rows start:stop and return as (masked) array"""
+        import numpy as np
+
+        is_checked = self.check_read()
+
+        # read header if possible
+        if not self.header:
+            self.header = self.read_header(is_checked=is_checked)
+
+        # clip row range to grid
+        start = max(start, 0)
+        stop = min(stop, self.header['nrow'])
+        ncol = self.header['ncol']
+
+        # set file to start of first row
+        self.f.seek(self.irec + start * ncol * self.itemsize)
+
+        # read values
+        values = self.read_values(max(stop - start, 0) * ncol)
+        values = values.reshape(-1, ncol)
+        if dtype is not None:
+            values = values.astype(dtype, copy=False)
 
         if masked:
             return np.ma.masked_values(values, self.header['nodata'])
         else:
             return values
 
+    def read_values(self, count):
+        """read count values from current position into new array
+
+        Values are read into a preallocated array of the file dtype using
+        readinto, which works for any binary file-like object. Objects
+        without readinto, such as mmap, are read with read.
+        """
+        import numpy as np
+
+        values = np.empty(count, dtype=self.dtype)
+        buffer = memoryview(values).cast('B')
+        nbytes = 0
+        readinto = getattr(self.f, 'readinto', None)
+        while nbytes < len(buffer):
+            if readinto is not None:
+                n = readinto(buffer[nbytes:])
+            else:
+                chunk = self.f.read(len(buffer) - nbytes)
+                n = len(chunk)
+                buffer[nbytes:nbytes + n] = chunk
+            if not n:
+                raise IOError('unexpected end of Idf file, read {r:d} of '
+                    '{n:d} bytes'.format(r=nbytes, n=len(buffer)))
+            nbytes += n
+        return values
+
+    def read_cell(self, row, col):
+        """read single value at row, col without reading other data"""
+        is_checked = self.check_read()
+
+        # read header if possible
+        if not self.header:
+            self.header = self.read_header(is_checked=is_checked)
+
+        if self.is_out_of_bounds(row, col):
+            raise IndexError('row, col = {r:}, {c:} out of bounds'.format(
+                r=row, c=col))
+
+        # set file to cell
+        self.f.seek(self.irec +
+            (row * self.header['ncol'] + col) * self.itemsize)
+        value, = struct.unpack(self.byteorder + self.realformat,
+            self.f.read(self.itemsize))
+        return value
+
+    def iter_blocks(self, blocksize=BLOCKSIZE, masked=False, dtype=None):
+        """iterate over blocks of rows, yield first row and (masked) array"""
+        self.check_read()
+        if not self.header:
+            self.header = self.read_header(is_checked=True)
+        for start in range(0, self.header['nrow'], blocksize):
+            yield start, self.read_rows(start, start + blocksize,
+                masked=masked, dtype=dtype)
+
     def check_write(self):
         """check if write to file is ok"""
-        if self.mode != 'wb':
+        if self.mode not in WRITE_MODES:
             raise ValueError("cannot write in '{}' mode".format(self.mode))
         if self.closed:
             raise IOError('cannot write to closed Idf file')
@@ -202,13 +476,22 @@ class IdfFile(object):
 
     def update_header(self, array):
         """update header based on Idf data"""
+        import numpy as np
 
         # update shape
         nrow, ncol = array.shape
         self.header['nrow'] = nrow
         self.header['ncol'] = ncol
-        self.header['xmax'] = self.header['xmin'] + self.header['dx'] * ncol
-        self.header['ymax'] = self.header['ymin'] + self.header['dy'] * nrow
+        if self.header['ieq']:
+            self.header['xmax'] = (self.header['xmin'] +
+                sum(self.header['dx(col)']))
+            self.header['ymax'] = (self.header['ymin'] +
+                sum(self.header['dy(row)']))
+        else:
+            self.header['xmax'] = (self.header['xmin'] +
+                self.header['dx'] * ncol)
+            self.header['ymax'] = (self.header['ymin'] +
+                self.header['dy'] * nrow)
 
         # update nodata value
         if isinstance(array, np.ma.MaskedArray):
@@ -226,26 +509,30 @@ class IdfFile(object):
         # set file back to first byte
         self.f.seek(0)
 
+        # set lahey record marker matching precision
+        if self.header.get('lahey') not in LAHEY[self.itemsize]:
+            self.header['lahey'] = LAHEY[self.itemsize][0]
+
         # write values according to headerformat
         header_values = [self.header[k] for k in IdfFileHeaderFormat.names]
-        self.f.write(struct.pack(IdfFileHeaderFormat.byteformat,
+        self.f.write(struct.pack(
+            IdfFileHeaderFormat.get_byteformat(self.itemsize, self.byteorder),
             *header_values,
             ))
 
         # write conditional values
+        b, r = self.byteorder, self.realformat
         if not self.header['ieq']:
-            self.f.write(struct.pack('2f',
+            self.f.write(struct.pack(b + 2*r,
                 self.header['dx'], self.header['dy']))
         if self.header['itb']:
-            self.f.write(struct.pack('2f',
+            self.f.write(struct.pack(b + 2*r,
                 self.header['top'], self.header['bot']))
         if self.header['ieq']:
-            self.f.write(struct.pack(len(self.header['dx(col)'])*'f',
-                self.header['dx(col)']))
-            self.f.write(struct.pack(len(self.header['dy(row)'])*'f',
-                self.header['dy(row)']))
-        if self.header['ivf']:
-            raise NotImplementedError('write method ivf=true not implemented')
+            self.f.write(struct.pack(b + len(self.header['dx(col)'])*r,
+                *self.header['dx(col)']))
+            self.f.write(struct.pack(b + len(self.header['dy(row)'])*r,
+                *self.header['dy(row)']))
 
     def write(self, array):
         """write to header and values to file"""
@@ -257,17 +544,34 @@ class IdfFile(object):
         # write header
         self.write_header(is_checked=is_checked)
 
-        # set file to start of data
-        self.f.seek(self.irec)
+        # write values
+        self.write_rows(array, 0)
+
+    def write_rows(self, array, start):
+        """write block of rows to file starting at row start
+
+        The header is not updated or written. When writing a file in blocks,
+        set the header before writing and call write_header afterwards to
+        store the final value range. Values are written in blocks of rows,
+        converted to the file dtype only if needed.
+        """
+        import numpy as np
+
+        self.check_write()
+
+        # set file to start of first row
+        ncol = self.header['ncol']
+        self.f.seek(self.irec + start * ncol * self.itemsize)
 
         # unmask
         if isinstance(array, np.ma.MaskedArray):
-            array.fill_value = self.header['nodata']
-            array = array.filled()
+            array = array.filled(self.header['nodata'])
 
         # write values
-        flattened = array.flatten()
-        self.f.write(struct.pack('f'*len(flattened), *flattened))
+        array = np.asarray(array).reshape(-1, ncol)
+        for i in range(0, array.shape[0], BLOCKSIZE):
+            self.f.write(np.ascontiguousarray(array[i:i + BLOCKSIZE],
+                dtype=self.dtype))
 
     def is_out_of_bounds(self, row, col):
         """return True if row, col is out of bounds according to header"""
@@ -276,6 +580,8 @@ class IdfFile(object):
 
     def sample(self, coords, bounds_warning=True):
         """sample Idf for sequence of X,Y coordinates"""
+        import numpy as np
+
         self.check_read()
 
         values = self.read(masked=True).filled(np.nan)
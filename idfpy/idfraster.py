@@ -3,14 +3,37 @@
 # Tom van Steijn, Royal HaskoningDHV
 
 from idfpy import idf
-
-from rasterio import Affine
-from rasterio.crs import CRS
-import rasterio
+from idfpy.lazy import optional_import
 
 import logging
 
 
+def write_raster(fp, array, geotransform, nodata, epsg=28992,
+        driver='GTiff'):
+    """write (masked) array to raster file using rasterio"""
+    rasterio = optional_import('rasterio', extra='raster')
+    from rasterio import Affine
+    from rasterio.crs import CRS
+
+    nrow, ncol = array.shape
+
+    # set profile
+    profile = {
+        'width': ncol,
+        'height': nrow,
+        'transform': Affine.from_gdal(*geotransform),
+        'nodata': nodata,
+        'count': 1,
+        'dtype': rasterio.float64,
+        'driver': driver,
+        'crs': CRS.from_epsg(epsg),
+    }
+
+    logging.info('writing to {f:}'.format(f=fp))
+    with rasterio.open(fp, 'w', **profile) as dst:
+        dst.write(array.astype(profile['dtype']), 1)
+
+
 class IdfRaster(idf.IdfFile):
     def to_raster(self, fp=None, epsg=28992, driver='AAIGrid'):
         """export Idf to a geotiff"""
@@ -20,18 +43,5 @@ class IdfRaster(idf.IdfFile):
             fp = self.filepath.replace('.idf', '.geotiff')
             logging.warning('no filepath was given, exported to {fp}'.format(fp=fp))
 
-        # set profile
-        profile = {
-            'width': self.header['ncol'],
-            'height': self.header['nrow'],
-            'transform': Affine.from_gdal(*self.geotransform),
-            'nodata': self.header['nodata'],
-            'count': 1,
-            'dtype': rasterio.float64,
-            'driver': driver,
-            'crs': CRS.from_epsg(epsg),
-        }
-
-        logging.info('writing to {f:}'.format(f=fp))
-        with rasterio.open(fp, 'w', **profile) as dst:
-            dst.write(self.masked_data.astype(profile['dtype']), 1)
\ No newline at end of file
+        write_raster(fp, self.masked_data, self.geotransform,
+            self.header['nodata'], epsg=epsg, driver=driver)
@@ -0,0 +1,16 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+import importlib
+
+
+def optional_import(name, extra=None):
+    '''import optional dependency or raise ImportError with install hint'''
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        hint = 'idfpy[{e:}]'.format(e=extra) if extra else name
+        raise ImportError(
+            '{n:} is required for this operation, install with '
+            '\'pip install {h:}\''.format(n=name, h=hint)) from None
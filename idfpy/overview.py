@@ -0,0 +1,195 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from idfpy import idf
+
+import numpy as np
+
+import math
+import os
+import warnings
+
+
+FACTORS = (2, 4, 8, 16, 32)
+
+METHODS = ('mean', 'nearest', 'min', 'max')
+
+# largest factor searched for when looking up existing overviews
+MAX_FACTOR = 2**12
+
+
+def overview_file(idffile, factor):
+    '''filename of overview sidecar, e.g. head.idf.ovr4 for head.idf
+
+    The suffix is not .idf, so sidecars do not match *.idf patterns.
+    '''
+    return '{i:}.ovr{f:d}'.format(i=idffile, f=factor)
+
+
+def is_valid(idffile, ovrfile):
+    '''True if overview exists and is not older than source'''
+    return (os.path.exists(ovrfile) and
+        os.path.getmtime(ovrfile) >= os.path.getmtime(str(idffile)))
+
+
+def overview_header(header, factor):
+    '''header of overview with cells factor times as large
+
+    The overview covers the source extent rounded up to whole cells.
+    '''
+    if header['ieq']:
+        raise ValueError('cannot build overviews of non-equidistant grid')
+    ovr = header.copy()
+    ovr['nrow'] = -(-header['nrow'] // factor)
+    ovr['ncol'] = -(-header['ncol'] // factor)
+    ovr['dx'] = header['dx'] * factor
+    ovr['dy'] = header['dy'] * factor
+    ovr['xmax'] = ovr['xmin'] + ovr['dx'] * ovr['ncol']
+    ovr['ymin'] = ovr['ymax'] - ovr['dy'] * ovr['nrow']
+    return ovr
+
+
+def decimate(values, factor, method='mean'):
+    '''reduce array with NaN for nodata by factor in both directions'''
+    nrow, ncol = values.shape
+    if method == 'nearest':
+        rows = np.minimum(np.arange(0, nrow, factor) + factor // 2, nrow - 1)
+        cols = np.minimum(np.arange(0, ncol, factor) + factor // 2, ncol - 1)
+        return values[np.ix_(rows, cols)]
+
+    # pad to whole windows and reduce each window
+    padded = np.full((-(-nrow // factor) * factor, -(-ncol // factor) * factor),
+        np.nan, dtype=values.dtype)
+    padded[:nrow, :ncol] = values
+    windows = padded.reshape(padded.shape[0] // factor, factor,
+        padded.shape[1] // factor, factor)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        if method == 'mean':
+            return np.nanmean(windows, axis=(1, 3))
+        elif method == 'min':
+            return np.nanmin(windows, axis=(1, 3))
+        elif method == 'max':
+            return np.nanmax(windows, axis=(1, 3))
+    raise ValueError('method must be one of {m:}'.format(
+        m=', '.join(METHODS)))
+
+
+def build_overviews(idffile, factors=FACTORS, method='mean',
+        blocksize=idf.BLOCKSIZE):
+    '''build overview sidecars for all factors in a single pass over source
+
+    Returns list of overview filenames.
+    '''
+    idffile = str(idffile)
+    with idf.IdfFile(idffile) as src:
+        header = src.header
+        factors = sorted(f for f in factors
+            if f < max(header['nrow'], header['ncol']))
+        if not factors:
+            return []
+
+        # blocks of whole windows for all factors
+        step = factors[0]
+        for factor in factors[1:]:
+            step = step * factor // math.gcd(step, factor)
+        blocksize = max(blocksize // step, 1) * step
+
+        ovrfiles = [overview_file(idffile, f) for f in factors]
+        dsts = [idf.IdfFile(o, 'wb', overview_header(header, f))
+            for o, f in zip(ovrfiles, factors)]
+        ranges = [[np.inf, -np.inf] for f in factors]
+        try:
+            for start, block in src.iter_blocks(blocksize=blocksize,
+                    dtype=src.native_dtype):
+                block[block == header['nodata']] = np.nan
+                for factor, dst, vrange in zip(factors, dsts, ranges):
+                    reduced = decimate(block, factor, method=method)
+                    if np.any(~np.isnan(reduced)):
+                        vrange[0] = min(vrange[0], np.nanmin(reduced))
+                        vrange[1] = max(vrange[1], np.nanmax(reduced))
+                    reduced[np.isnan(reduced)] = header['nodata']
+                    dst.write_rows(reduced, start // factor)
+            for dst, vrange in zip(dsts, ranges):
+                if np.isfinite(vrange[0]):
+                    dst.header['dmin'], dst.header['dmax'] = vrange
+                dst.write_header()
+        finally:
+            for dst in dsts:
+                dst.close()
+    return ovrfiles
+
+
+def find_overviews(idffile):
+    '''dict of factor and filename of valid overviews of idffile'''
+    idffile = str(idffile)
+    overviews = {}
+    factor = 2
+    while factor <= MAX_FACTOR:
+        ovrfile = overview_file(idffile, factor)
+        if is_valid(idffile, ovrfile):
+            overviews[factor] = ovrfile
+        factor *= 2
+    return overviews
+
+
+def best_overview(idffile, factor, overviews=None):
+    '''largest valid overview with factor smaller than or equal to factor
+
+    Overviews are looked up with find_overviews unless given. Returns
+    factor and filename of overview, or 1 and idffile itself.
+    '''
+    if overviews is None:
+        overviews = find_overviews(idffile)
+    usable = [f for f in overviews if f <= factor]
+    if usable:
+        best = max(usable)
+        return best, overviews[best]
+    return 1, str(idffile)
+
+
+def resample_nearest(values, out_shape, src_shape=None, factor=1):
+    '''nearest neighbour resample of values to out_shape
+
+    When values is an overview, src_shape is the shape of the source grid
+    and factor the overview factor.
+    '''
+    out_nrow, out_ncol = out_shape
+    src_nrow, src_ncol = src_shape or values.shape
+    rows = ((np.arange(out_nrow) + 0.5) * src_nrow / out_nrow).astype(np.int64)
+    cols = ((np.arange(out_ncol) + 0.5) * src_ncol / out_ncol).astype(np.int64)
+    return values[np.ix_(rows // factor, cols // factor)]
+
+
+def read(src, out_shape, masked=False, dtype=None):
+    '''read IdfFile at out_shape using the closest overview if available'''
+    out_nrow, out_ncol = out_shape
+    if out_nrow < 1 or out_ncol < 1:
+        raise ValueError('out_shape must be positive, got {s:}'.format(
+            s=tuple(out_shape)))
+    src_shape = src.header['nrow'], src.header['ncol']
+    factor = min(src_shape[0] // out_nrow, src_shape[1] // out_ncol)
+    try:
+        filepath = os.fspath(src.filepath)
+    except TypeError:  # not a path
+        filepath = None
+    if factor >= 2 and filepath is not None:
+        factor, ovrfile = best_overview(filepath, factor)
+    else:
+        factor = 1
+
+    if factor > 1:
+        with idf.IdfFile(ovrfile) as ovr:
+            values = ovr.read(dtype=dtype)
+            nodata = ovr.header['nodata']
+    else:
+        values = src.read(dtype=dtype)
+        nodata = src.header['nodata']
+
+    values = resample_nearest(values, out_shape, src_shape=src_shape,
+        factor=factor)
+    if masked:
+        return np.ma.masked_values(values, nodata)
+    else:
+        return values
@@ -0,0 +1,327 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from idfpy import idf
+
+import numpy as np
+
+import numbers
+
+
+MODES = ('centroid', 'all_touched', 'fraction')
+
+
+class Geometries(object):
+    """Polygon edges and line segments of shapes as flat arrays
+
+    Every edge or segment is stored as x0, y0, x1, y1 and the index of its
+    shape. Polygon edges include the edges of holes. Points are segments
+    of zero length. Shapes are GeoJSON-like geometry mappings, features or
+    objects with __geo_interface__, optionally paired with a value.
+    """
+    def __init__(self, shapes, default_value=1.):
+        edges, segments, values = [], [], []
+        for shape in shapes:
+            if isinstance(shape, (tuple, list)):
+                geometry, value = shape
+            else:
+                geometry, value = shape, default_value
+            if not isinstance(value, numbers.Number):
+                raise ValueError('shape value must be a number')
+            index = len(values)
+            values.append(value)
+            for kind, coords in self.iter_parts(geometry):
+                if kind == 'ring':
+                    edges.append(self.to_segments(coords, index, close=True))
+                else:
+                    segments.append(self.to_segments(coords, index))
+        self.edges = self.stack(edges)
+        self.segments = self.stack(segments)
+        self.values = np.asarray(values, dtype=np.float64)
+
+    def __repr__(self):
+        return ('{s.__class__.__name__:}(shapes={n:d}, edges={e:d}, '
+            'segments={g:d})').format(s=self, n=len(self.values),
+            e=len(self.edges[0]), g=len(self.segments[0]))
+
+    @staticmethod
+    def iter_parts(geometry):
+        """iterate over rings and lines of geometry"""
+        geometry = getattr(geometry, '__geo_interface__', geometry)
+        if geometry.get('type') == 'Feature':
+            geometry = geometry['geometry']
+        kind = geometry['type']
+        if kind == 'GeometryCollection':
+            for part in geometry['geometries']:
+                yield from Geometries.iter_parts(part)
+        elif kind == 'Polygon':
+            for ring in geometry['coordinates']:
+                yield 'ring', ring
+        elif kind == 'MultiPolygon':
+            for polygon in geometry['coordinates']:
+                for ring in polygon:
+                    yield 'ring', ring
+        elif kind == 'LineString':
+            yield 'line', geometry['coordinates']
+        elif kind == 'MultiLineString':
+            for line in geometry['coordinates']:
+                yield 'line', line
+        elif kind == 'Point':
+            yield 'line', [geometry['coordinates']]
+        elif kind == 'MultiPoint':
+            for point in geometry['coordinates']:
+                yield 'line', [point]
+        else:
+            raise ValueError('unsupported geometry type \'{t:}\''.format(
+                t=kind))
+
+    @staticmethod
+    def to_segments(coords, index, close=False):
+        """segments between consecutive vertices as x0, y0, x1, y1, index"""
+        xy = np.asarray(coords, dtype=np.float64).reshape(-1,
+            len(coords[0]))[:, :2]
+        if close and not np.array_equal(xy[0], xy[-1]):
+            xy = np.vstack([xy, xy[:1]])
+        if len(xy) == 1:  # point
+            xy = np.vstack([xy, xy])
+        return np.column_stack([xy[:-1], xy[1:],
+            np.full(len(xy) - 1, index)])
+
+    @staticmethod
+    def stack(parts):
+        """tuple of arrays x0, y0, x1, y1 and integer shape index"""
+        if parts:
+            stacked = np.concatenate(parts)
+        else:
+            stacked = np.empty((0, 5))
+        x0, y0, x1, y1, index = stacked.T
+        return x0, y0, x1, y1, index.astype(np.int64)
+
+
+def expand_ranges(first, stop):
+    '''index of range and value for every value in ranges first:stop'''
+    counts = np.maximum(stop - first, 0)
+    owner = np.repeat(np.arange(len(first)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts,
+        counts)
+    return owner, np.repeat(first, counts) + offsets
+
+
+def bucket(segments, tops, bottoms):
+    '''segments overlapping each block of rows, one tuple per block
+
+    tops and bottoms are the descending y of the upper and lower edges of
+    the blocks. Every segment is assigned to the blocks its y range spans,
+    so a block only gets the segments that overlap it.
+    '''
+    x0, y0, x1, y1, index = segments
+    ylo, yhi = np.minimum(y0, y1), np.maximum(y0, y1)
+    first = np.searchsorted(-bottoms, -yhi, side='left')
+    stop = np.searchsorted(-tops, -ylo, side='right')
+    owner, blocks = expand_ranges(first, stop)
+    order = np.argsort(blocks, kind='stable')
+    owner = owner[order]
+    bounds = np.searchsorted(blocks[order], np.arange(len(tops) + 1))
+    return [tuple(a[owner[b0:b1]] for a in segments)
+        for b0, b1 in zip(bounds[:-1], bounds[1:])]
+
+
+def scan_polygons(edges, x, y):
+    '''cells with center inside polygons by scanline crossings of edges
+
+    x are ascending column centers and y descending row centers. Each
+    edge crosses the rows with center in its half-open y range, so every
+    ring has an even number of crossings per row and spans follow from
+    pairing sorted crossings per shape (even-odd rule, holes excluded).
+    Returns shape index, row and column of cells.
+    '''
+    x0, y0, x1, y1, index = edges
+    ylo, yhi = np.minimum(y0, y1), np.maximum(y0, y1)
+
+    # rows with center y in [ylo, yhi), using ascending -y
+    first = np.searchsorted(-y, -yhi, side='right')
+    stop = np.searchsorted(-y, -ylo, side='right')
+    owner, rows = expand_ranges(first, stop)
+
+    # x of crossings, sorted per shape and row
+    yc = y[rows]
+    xc = x0[owner] + (yc - y0[owner]) * (
+        (x1 - x0)[owner] / (y1 - y0)[owner])
+    shapes = index[owner]
+    order = np.lexsort((xc, rows, shapes))
+    shapes, rows, xc = shapes[order], rows[order], xc[order]
+
+    # spans between pairs of crossings, cells with center in [xa, xb)
+    shapes, rows = shapes[0::2], rows[0::2]
+    cfirst = np.searchsorted(x, xc[0::2], side='left')
+    cstop = np.searchsorted(x, xc[1::2], side='left')
+    owner, cols = expand_ranges(cfirst, cstop)
+    return shapes[owner], rows[owner], cols
+
+
+def supercover(segments, xedges, yedges):
+    '''cells crossed or touched by segments (supercover)
+
+    Segments are split at every column and row edge they cross, every
+    piece lies in a single cell. xedges are ascending and yedges
+    descending. Returns shape index, row and column of cells.
+    '''
+    x0, y0, x1, y1, index = segments
+    n = len(x0)
+    xlo, xhi = np.minimum(x0, x1), np.maximum(x0, x1)
+    ylo, yhi = np.minimum(y0, y1), np.maximum(y0, y1)
+
+    # segment parameter t at crossings with column and row edges
+    ox, ix = expand_ranges(np.searchsorted(xedges, xlo, side='right'),
+        np.searchsorted(xedges, xhi, side='left'))
+    tx = (xedges[ix] - x0[ox]) / (x1 - x0)[ox]
+    oy, iy = expand_ranges(np.searchsorted(-yedges, -yhi, side='right'),
+        np.searchsorted(-yedges, -ylo, side='left'))
+    ty = (yedges[iy] - y0[oy]) / (y1 - y0)[oy]
+
+    owner = np.concatenate([np.arange(n), np.arange(n), ox, oy])
+    t = np.concatenate([np.zeros(n), np.ones(n), tx, ty])
+    order = np.lexsort((t, owner))
+    owner, t = owner[order], t[order]
+
+    # midpoints of pieces between consecutive crossings
+    is_piece = (owner[1:] == owner[:-1]) & (t[1:] > t[:-1])
+    tm = ((t[1:] + t[:-1]) / 2.)[is_piece]
+    owner = owner[1:][is_piece]
+    xm = x0[owner] + tm * (x1 - x0)[owner]
+    ym = y0[owner] + tm * (y1 - y0)[owner]
+
+    cols = np.searchsorted(xedges, xm, side='right') - 1
+    rows = np.searchsorted(-yedges, -ym, side='right') - 1
+    is_inside = ((cols >= 0) & (cols < len(xedges) - 1) &
+        (rows >= 0) & (rows < len(yedges) - 1))
+    return index[owner][is_inside], rows[is_inside], cols[is_inside]
+
+
+def burn(block, geometries, shapes, rows, cols):
+    '''set cells to shape values, later shapes overwrite earlier shapes'''
+    order = np.argsort(shapes, kind='stable')
+    block[rows[order], cols[order]] = geometries.values[shapes[order]]
+
+
+def subcenters(edges, supersample):
+    '''centers of cells split in supersample parts between edges'''
+    offsets = (np.arange(supersample) + 0.5) / supersample
+    return (edges[:-1, np.newaxis] +
+        np.diff(edges)[:, np.newaxis] * offsets).ravel()
+
+
+def rasterize_block(geometries, edges, segments, grid, start, stop, fill,
+        mode='centroid', supersample=4, dtype=np.float32):
+    '''rasterize edges and segments of geometries for rows start:stop of grid
+
+    edges and segments are those overlapping the rows, see bucket. grid is
+    a tuple of cell edges and cell centers xedges, yedges, x, y.
+    '''
+    xedges, yedges, x, y = grid
+    ncol = len(x)
+    block = np.full((stop - start, ncol), fill, dtype=dtype)
+
+    if mode == 'fraction':
+        ys = subcenters(yedges[start:stop + 1], supersample)
+        xs = subcenters(xedges, supersample)
+        covered = np.zeros((len(ys), len(xs)), dtype=bool)
+        _, rows, cols = scan_polygons(edges, xs, ys)
+        covered[rows, cols] = True
+        fraction = covered.reshape(stop - start, supersample,
+            ncol, supersample).mean(axis=(1, 3))
+        is_covered = fraction > 0.
+        block[is_covered] = fraction[is_covered]
+        return block
+
+    shapes, rows, cols = scan_polygons(edges, x, y[start:stop])
+    if mode == 'all_touched':
+        segments = tuple(np.concatenate([s, e])
+            for s, e in zip(segments, edges))
+    lshapes, lrows, lcols = supercover(segments, xedges,
+        yedges[start:stop + 1])
+    burn(block, geometries,
+        np.concatenate([shapes, lshapes]),
+        np.concatenate([rows, lrows]),
+        np.concatenate([cols, lcols]))
+    return block
+
+
+def get_header(template):
+    '''header from dict, IdfFile or path of Idf file'''
+    if isinstance(template, dict):
+        return template
+    if isinstance(template, idf.IdfFile):
+        return template.header
+    with idf.IdfFile(str(template)) as src:
+        return src.header
+
+
+def iter_rasterize(shapes, template, fill=None, default_value=1.,
+        mode='centroid', supersample=4, blocksize=idf.BLOCKSIZE,
+        dtype=np.float32):
+    '''rasterize shapes on grid of template, yield first row and block
+
+    In centroid mode polygons burn cells with their center inside, in
+    all_touched mode every cell touched by a polygon. Lines and points
+    always burn every cell they touch. Later shapes overwrite earlier
+    shapes. In fraction mode cells get the fraction of their area covered
+    by polygons, estimated from supersample x supersample subcells per
+    cell. Cells not burned get fill, default the nodata value.
+    '''
+    if mode not in MODES:
+        raise ValueError('mode must be one of {m:}'.format(
+            m=', '.join(MODES)))
+    header = get_header(template)
+    if fill is None:
+        fill = header['nodata']
+    if not isinstance(shapes, Geometries):
+        shapes = Geometries(shapes, default_value=default_value)
+    if mode == 'fraction' and len(shapes.segments[0]):
+        raise ValueError('fraction mode only supports polygons')
+
+    grid = idf.cell_edges(header) + idf.cell_centers(header)
+
+    # keep supersampled blocks of fraction mode about blocksize rows
+    if mode == 'fraction':
+        blocksize = max(blocksize // supersample**2, 1)
+    starts = list(range(0, header['nrow'], blocksize))
+    stops = [min(start + blocksize, header['nrow']) for start in starts]
+
+    # edges and segments per block
+    yedges = grid[1]
+    edges = bucket(shapes.edges, yedges[starts], yedges[stops])
+    segments = bucket(shapes.segments, yedges[starts], yedges[stops])
+    for i, (start, stop) in enumerate(zip(starts, stops)):
+        yield start, rasterize_block(shapes, edges[i], segments[i], grid,
+            start, stop, fill, mode=mode, supersample=supersample,
+            dtype=dtype)
+
+
+def rasterize(shapes, template, **kwargs):
+    '''rasterize shapes on grid of template as array, see iter_rasterize'''
+    header = get_header(template)
+    blocks = [block for start, block in iter_rasterize(shapes, header,
+        **kwargs)]
+    return np.concatenate(blocks)
+
+
+def rasterize_idf(shapes, outfile, template, dtype=None, **kwargs):
+    '''rasterize shapes on grid of template and write outfile in blocks
+
+    See iter_rasterize for keyword arguments.
+    '''
+    header = get_header(template).copy()
+    with idf.IdfFile(str(outfile), 'wb', header, dtype=dtype) as dst:
+        dmin, dmax = np.inf, -np.inf
+        for start, block in iter_rasterize(shapes, header,
+                dtype=dst.dtype, **kwargs):
+            is_valid = block != header['nodata']
+            if np.any(is_valid):
+                dmin = min(dmin, block[is_valid].min())
+                dmax = max(dmax, block[is_valid].max())
+            dst.write_rows(block, start)
+        if np.isfinite(dmin):
+            dst.header['dmin'], dst.header['dmax'] = dmin, dmax
+        dst.write_header()
@@ -0,0 +1,425 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from idfpy import idf
+from idfpy import overview
+
+import numpy as np
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+import asyncio
+import json
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+
+
+TILESIZE = 256
+
+# default byte budget of the tile cache
+CACHE_BYTES = 256 * 2**20
+
+# colormap anchors (viridis), interpolated to a 256 color lookup table
+COLORMAP_ANCHORS = [
+    (68, 1, 84),
+    (59, 82, 139),
+    (33, 145, 140),
+    (94, 201, 98),
+    (253, 231, 37),
+    ]
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found',
+    500: 'Internal Server Error'}
+
+
+def colormap_lut(anchors=COLORMAP_ANCHORS):
+    '''256 x 4 RGBA lookup table interpolated between anchor colors'''
+    anchors = np.asarray(anchors, dtype=np.float64)
+    positions = np.linspace(0., 1., len(anchors))
+    levels = np.linspace(0., 1., 256)
+    lut = np.full((256, 4), 255, dtype=np.uint8)
+    for channel in range(3):
+        lut[:, channel] = np.round(
+            np.interp(levels, positions, anchors[:, channel]))
+    return lut
+
+
+LUT = colormap_lut()
+
+
+def colorize(values, vmin, vmax, lut=LUT):
+    '''RGBA array of values using lookup table, transparent for NaN'''
+    scale = 255. / (vmax - vmin) if vmax > vmin else 0.
+    index = np.clip((values - vmin) * scale, 0., 255.)
+    is_nan = np.isnan(values)
+    index[is_nan] = 0.
+    rgba = lut[index.astype(np.uint8)]
+    rgba[is_nan, 3] = 0
+    return rgba
+
+
+def encode_png(rgba, level=6):
+    '''encode RGBA uint8 array as PNG bytes'''
+    height, width, _ = rgba.shape
+
+    def chunk(tag, data):
+        return (struct.pack('>I', len(data)) + tag + data +
+            struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff))
+
+    # each scanline starts with filter type 0
+    raw = np.zeros((height, width * 4 + 1), dtype=np.uint8)
+    raw[:, 1:] = rgba.reshape(height, width * 4)
+    ihdr = struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', ihdr) +
+        chunk(b'IDAT', zlib.compress(raw.tobytes(), level)) +
+        chunk(b'IEND', b''))
+
+
+class TileCache(object):
+    """Thread safe LRU cache of tiles limited by total size in bytes"""
+    def __init__(self, max_bytes=CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, key):
+        """return cached bytes or None"""
+        with self._lock:
+            value = self._items.get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        """add bytes, evicting least recently used tiles over budget"""
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._items:
+                self.nbytes -= len(self._items.pop(key))
+            self._items[key] = value
+            self.nbytes += len(value)
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self.nbytes -= len(evicted)
+
+    def discard(self, name):
+        """remove all tiles of layer name"""
+        with self._lock:
+            for key in [k for k in self._items if k[0] == name]:
+                self.nbytes -= len(self._items.pop(key))
+
+
+class Layer(object):
+    """Idf file served as tiles
+
+    Header and overviews are looked up again when the modification time
+    of the Idf file changes, see refresh.
+    """
+    def __init__(self, idffile):
+        self.idffile = str(idffile)
+        self.name = os.path.splitext(os.path.basename(self.idffile))[0]
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        """read header and find valid overviews of Idf file"""
+        mtime = os.stat(self.idffile).st_mtime_ns
+        with idf.IdfFile(self.idffile) as src:
+            header = src.header
+        if header['ieq']:
+            raise ValueError('cannot serve non-equidistant grid {f:}'.format(
+                f=self.idffile))
+        self.header = header
+        self.overviews = overview.find_overviews(self.idffile)
+        self.mtime = mtime
+
+    def refresh(self):
+        """reload if Idf file changed, return True if reloaded"""
+        with self._lock:
+            if os.stat(self.idffile).st_mtime_ns == self.mtime:
+                return False
+            self.load()
+            return True
+
+    @property
+    def bounds(self):
+        return (self.header['xmin'], self.header['ymin'],
+            self.header['xmax'], self.header['ymax'])
+
+    def read_window(self, x, y, cellsize):
+        """sample values at cell centers x, y reading only covered rows
+
+        Reads from the coarsest overview that is finer than cellsize.
+        """
+        factor = int(cellsize // min(self.header['dx'], self.header['dy']))
+        if factor >= 2:
+            factor, idffile = overview.best_overview(self.idffile, factor,
+                overviews=self.overviews)
+        else:
+            idffile = self.idffile
+
+        xx, yy = np.meshgrid(x, y)
+        values = np.full(xx.shape, np.nan, dtype=np.float32)
+        with idf.IdfFile(idffile) as src:
+            row, col, is_valid = idf.cell_indices(src.header, xx, yy)
+            if not np.any(is_valid):
+                return values
+            start = row[is_valid].min()
+            stop = row[is_valid].max() + 1
+            window = src.read_rows(start, stop)
+            sampled = window[row[is_valid] - start, col[is_valid]]
+            sampled[sampled == src.header['nodata']] = np.nan
+            values[is_valid] = sampled
+        return values
+
+
+class TileServer(object):
+    """Tiles of Idf files over HTTP
+
+    Tiles are addressed as /{layer}/{z}/{x}/{y}.png or .f32 (raw little
+    endian float32, NaN for nodata). Tile z=0 covers the square around
+    the combined extent of all layers with its origin at the upper left,
+    every zoom level halves the tile size. GET /layers returns the layers
+    and tile scheme as JSON.
+    """
+    def __init__(self, idffiles, cache_bytes=CACHE_BYTES, workers=None,
+            tilesize=TILESIZE):
+        self.layers = OrderedDict()
+        for idffile in idffiles:
+            layer = Layer(idffile)
+            self.layers[layer.name] = layer
+        if not self.layers:
+            raise ValueError('no Idf files to serve')
+        self.tilesize = tilesize
+        self.cache = TileCache(cache_bytes)
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+
+        bounds = np.array([l.bounds for l in self.layers.values()])
+        self.origin = bounds[:, 0].min(), bounds[:, 3].max()
+        self.extent = max(bounds[:, 2].max() - self.origin[0],
+            self.origin[1] - bounds[:, 1].min())
+
+    def tile_bounds(self, z, x, y):
+        """xmin, ymin, xmax, ymax of tile"""
+        size = self.extent / 2**z
+        xmin = self.origin[0] + x * size
+        ymax = self.origin[1] - y * size
+        return xmin, ymax - size, xmin + size, ymax
+
+    def render(self, name, z, x, y):
+        """tile values as float32 array with NaN for nodata"""
+        xmin, ymin, xmax, ymax = self.tile_bounds(z, x, y)
+        cellsize = (xmax - xmin) / self.tilesize
+        centers = (np.arange(self.tilesize) + 0.5) * cellsize
+        return self.layers[name].read_window(xmin + centers, ymax - centers,
+            cellsize)
+
+    def tile(self, name, z, x, y, fmt='png', vmin=None, vmax=None):
+        """encoded tile, from cache if available
+
+        Cached tiles of a layer are discarded when its Idf file changed.
+        """
+        layer = self.layers[name]
+        if layer.refresh():
+            self.cache.discard(name)
+        if vmin is None:
+            vmin = layer.header['dmin']
+        if vmax is None:
+            vmax = layer.header['dmax']
+        key = (name, z, x, y, fmt, vmin, vmax)
+        data = self.cache.get(key)
+        if data is None:
+            values = self.render(name, z, x, y)
+            if fmt == 'png':
+                data = encode_png(colorize(values, vmin, vmax))
+            else:
+                data = values.astype('<f4').tobytes()
+            self.cache.put(key, data)
+        return data
+
+    def layers_json(self):
+        """layers and tile scheme as JSON bytes"""
+        return json.dumps({
+            'origin': self.origin,
+            'extent': self.extent,
+            'tilesize': self.tilesize,
+            'layers': {n: {'bounds': l.bounds,
+                'dmin': l.header['dmin'], 'dmax': l.header['dmax']}
+                for n, l in self.layers.items()},
+            }).encode()
+
+    def route(self, target):
+        """status, content type and body for request target"""
+        url = urlsplit(target)
+        parts = url.path.strip('/').split('/')
+        if parts == ['layers']:
+            return 200, 'application/json', self.layers_json()
+        if len(parts) != 4 or parts[0] not in self.layers:
+            return 404, 'text/plain', b'not found'
+        name, z, x, tail = parts
+        y, _, fmt = tail.partition('.')
+        if fmt not in ('png', 'f32'):
+            return 404, 'text/plain', b'not found'
+        try:
+            z, x, y = int(z), int(x), int(y)
+            query = parse_qs(url.query)
+            vmin = float(query['vmin'][0]) if 'vmin' in query else None
+            vmax = float(query['vmax'][0]) if 'vmax' in query else None
+        except ValueError:
+            return 400, 'text/plain', b'bad tile address'
+        if not (0 <= x < 2**z and 0 <= y < 2**z):
+            return 404, 'text/plain', b'tile out of range'
+        content_type = 'image/png' if fmt == 'png' else \
+            'application/octet-stream'
+        return 200, content_type, self.tile(name, z, x, y, fmt=fmt,
+            vmin=vmin, vmax=vmax)
+
+    async def handle(self, reader, writer):
+        """handle HTTP/1.1 connection, keeping it alive between requests"""
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    key, _, value = line.decode('latin-1').partition(':')
+                    headers[key.strip().lower()] = value.strip()
+                try:
+                    method, target, version = request_line.decode(
+                        'latin-1').split()
+                except ValueError:
+                    method, target, version = None, '', 'HTTP/1.0'
+                if method != 'GET':
+                    status, content_type, body = 400, 'text/plain', \
+                        b'bad request'
+                else:
+                    try:
+                        status, content_type, body = await loop.run_in_executor(
+                            self.executor, self.route, target)
+                    except Exception:
+                        logging.exception('error serving {t:}'.format(
+                            t=target))
+                        status, content_type, body = 500, 'text/plain', \
+                            b'internal server error'
+                keep_alive = (version == 'HTTP/1.1' and
+                    headers.get('connection', '').lower() != 'close')
+                writer.write((
+                    'HTTP/1.1 {s:d} {r:}\r\n'
+                    'Content-Type: {c:}\r\n'
+                    'Content-Length: {n:d}\r\n'
+                    'Access-Control-Allow-Origin: *\r\n'
+                    'Connection: {k:}\r\n\r\n').format(
+                    s=status, r=REASONS[status], c=content_type, n=len(body),
+                    k='keep-alive' if keep_alive else 'close',
+                    ).encode('latin-1') + body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def close(self):
+        """shut down thread pool rendering tiles"""
+        self.executor.shutdown(wait=True)
+
+    async def start(self, host='127.0.0.1', port=8000):
+        """start serving, return asyncio server"""
+        return await asyncio.start_server(self.handle, host, port)
+
+    def serve_forever(self, host='127.0.0.1', port=8000):
+        """serve until interrupted"""
+        async def main():
+            server = await self.start(host, port)
+            logging.info('serving {n:d} layers on http://{h:}:{p:d}'.format(
+                n=len(self.layers), h=host, p=port))
+            async with server:
+                await server.serve_forever()
+        try:
+            asyncio.run(main())
+        finally:
+            self.close()
+
+
+async def _fetch(reader, writer, host, path):
+    '''GET path on open keep-alive connection, return status and body'''
+    writer.write('GET {p:} HTTP/1.1\r\nHost: {h:}\r\n\r\n'.format(
+        p=path, h=host).encode('latin-1'))
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        key, _, value = line.decode('latin-1').partition(':')
+        if key.strip().lower() == 'content-length':
+            length = int(value)
+    return status, await reader.readexactly(length)
+
+
+def benchmark(paths, host='127.0.0.1', port=8000, concurrency=8):
+    '''request paths with concurrent keep-alive connections
+
+    Returns dict with number of requests, errors, requests per second and
+    median and 95th percentile latency in seconds.
+    '''
+    queue = list(paths)
+    latencies = []
+    errors = []
+
+    async def client():
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            while queue:
+                path = queue.pop()
+                t0 = time.perf_counter()
+                status, _ = await _fetch(reader, writer, host, path)
+                latencies.append(time.perf_counter() - t0)
+                if status != 200:
+                    errors.append(path)
+        finally:
+            writer.close()
+
+    async def main():
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+
+    t0 = time.perf_counter()
+    asyncio.run(main())
+    elapsed = time.perf_counter() - t0
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'requests_per_second': len(latencies) / elapsed,
+        'latency_p50': float(np.percentile(latencies, 50)),
+        'latency_p95': float(np.percentile(latencies, 95)),
+        }
+
+
+def tile_paths(layers, zooms, fmt='png'):
+    '''paths of all tiles of layers at zoom levels'''
+    return ['/{l:}/{z:d}/{x:d}/{y:d}.{f:}'.format(l=l, z=z, x=x, y=y, f=fmt)
+        for l in layers for z in zooms
+        for x in range(2**z) for y in range(2**z)]
@@ -0,0 +1,215 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from idfpy import idf
+from idfpy import io
+
+import numpy as np
+
+import hashlib
+import json
+import logging
+import os
+
+
+# methods that can be derived from the stored aggregation state
+METHODS = ('min', 'max', 'sum', 'mean')
+
+
+def state_file(outfile):
+    '''filename of aggregation state stored next to output file'''
+    return str(outfile) + '.state.npz'
+
+
+def file_hash(filepath, chunksize=2**20):
+    '''SHA1 hex digest of file contents'''
+    sha1 = hashlib.sha1()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunksize), b''):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+def fingerprint(filepath, use_hash=False):
+    '''fingerprint of file from modification time and size or content hash'''
+    if use_hash:
+        return {'hash': file_hash(filepath)}
+    stat = os.stat(filepath)
+    return {'mtime': stat.st_mtime_ns, 'size': stat.st_size}
+
+
+class StackState(object):
+    """Running sum, count, min and max of a stack of Idf files
+
+    Files can be added at any time. Removing a file subtracts it from the
+    sum and count, but leaves min and max invalid until a full recompute.
+    Files that do not fit the grid are kept in rejected with their
+    fingerprint, so they are only read again when they change.
+    """
+    def __init__(self, header, inputs=None, total=None, count=None,
+            minimum=None, maximum=None, extrema_valid=True, rejected=None):
+        self.header = header
+        self.inputs = inputs or {}
+        self.rejected = rejected or {}
+        shape = self.shape
+        self.sum = np.zeros(shape, np.float64) if total is None else total
+        self.count = np.zeros(shape, np.int32) if count is None else count
+        self.min = (np.full(shape, np.inf, np.float32) if minimum is None
+            else minimum)
+        self.max = (np.full(shape, -np.inf, np.float32) if maximum is None
+            else maximum)
+        self.extrema_valid = extrema_valid
+
+    def __repr__(self):
+        return '{s.__class__.__name__:}(shape={s.shape:}, inputs={n:d})'.format(
+            s=self, n=len(self.inputs))
+
+    @property
+    def shape(self):
+        return self.header['nrow'], self.header['ncol']
+
+    @classmethod
+    def load(cls, statefile):
+        """load state from npz file"""
+        with np.load(statefile) as state:
+            meta = json.loads(str(state['meta']))
+            return cls(
+                header=meta['header'],
+                inputs=meta['inputs'],
+                total=state['sum'],
+                count=state['count'],
+                minimum=state['min'],
+                maximum=state['max'],
+                extrema_valid=meta['extrema_valid'],
+                rejected=meta.get('rejected', {}),
+                )
+
+    def save(self, statefile):
+        """save state to npz file, replacing existing file at once"""
+        meta = json.dumps({
+            'header': self.header,
+            'inputs': self.inputs,
+            'extrema_valid': self.extrema_valid,
+            'rejected': self.rejected,
+            })
+        tmpfile = statefile + '.tmp.npz'
+        np.savez(tmpfile, sum=self.sum, count=self.count,
+            min=self.min, max=self.max, meta=np.array(meta))
+        os.replace(tmpfile, statefile)
+
+    def add(self, idffile, array, fingerprint):
+        """fold masked array of idffile into state"""
+        self.sum += array.filled(0.)
+        self.count += ~np.ma.getmaskarray(array)
+        np.minimum(self.min, array.filled(np.inf), out=self.min)
+        np.maximum(self.max, array.filled(-np.inf), out=self.max)
+        self.inputs[str(idffile)] = fingerprint
+
+    def reject(self, idffile, fingerprint):
+        """record idffile as not fitting the grid of the state"""
+        self.rejected[str(idffile)] = fingerprint
+
+    def remove(self, idffile, array):
+        """subtract masked array of idffile from state, invalidates min, max"""
+        self.sum -= array.filled(0.)
+        self.count -= ~np.ma.getmaskarray(array)
+        self.extrema_valid = False
+        del self.inputs[str(idffile)]
+
+    def result(self, method):
+        """aggregated masked array using method"""
+        if method not in METHODS:
+            raise ValueError('method must be one of {m:}'.format(
+                m=', '.join(METHODS)))
+        if method in ('min', 'max') and not self.extrema_valid:
+            raise ValueError('{m:} invalid after removing files'.format(
+                m=method))
+        mask = self.count == 0
+        if method == 'mean':
+            values = self.sum / np.where(mask, 1, self.count)
+        else:
+            values = getattr(self, method)
+        return np.ma.masked_array(values.astype(np.float32), mask=mask,
+            fill_value=self.header['nodata'])
+
+
+def compare(state, fingerprints):
+    '''added, removed and changed files of fingerprints compared to state
+
+    Rejected files are only added again if their fingerprint changed.
+    '''
+    added = [f for f in fingerprints if f not in state.inputs and
+        state.rejected.get(f) != fingerprints[f]]
+    removed = [f for f in state.inputs if f not in fingerprints]
+    changed = [f for f in fingerprints
+        if f in state.inputs and state.inputs[f] != fingerprints[f]]
+    return added, removed, changed
+
+
+def update(idffiles, outfile, method='mean', use_hash=False):
+    '''update stack of idffiles in outfile, recomputing only what changed
+
+    The aggregation state is stored next to outfile. Added files are folded
+    into the state. Files removed from the stack are subtracted if they are
+    still on disk and unchanged. Changed files, removed files that cannot be
+    read anymore and min or max after removals trigger a full recompute.
+    Files with a shape other than the stack are rejected and skipped until
+    they change. Returns dict with lists of added, removed, changed and
+    rejected files and a flag if the stack was recomputed.
+    '''
+    statefile = state_file(outfile)
+    idffiles = [str(f) for f in idffiles]
+    fingerprints = {f: fingerprint(f, use_hash=use_hash) for f in idffiles}
+
+    state = None
+    if os.path.exists(statefile):
+        state = StackState.load(statefile)
+        first_header = io.read_header(idffiles[0]) if idffiles else None
+        if first_header is not None and (
+                (first_header['nrow'], first_header['ncol']) != state.shape):
+            logging.warning('shape changed, recomputing {f:}'.format(
+                f=outfile))
+            state = None
+
+    if state is not None:
+        added, removed, changed = compare(state, fingerprints)
+        state.rejected = {f: p for f, p in state.rejected.items()
+            if fingerprints.get(f) == p}
+        recompute = bool(changed)
+        if not recompute:
+            removable = [f for f in removed if os.path.exists(f) and
+                fingerprint(f, use_hash=use_hash) == state.inputs[f]]
+            recompute = len(removable) < len(removed)
+        if not recompute:
+            for idffile in removable:
+                state.remove(idffile, io.read_array(idffile))
+            recompute = method in ('min', 'max') and not state.extrema_valid
+    else:
+        added, removed, changed = idffiles, [], []
+        recompute = True
+
+    if recompute:
+        if not idffiles:
+            raise ValueError('cannot recompute stack without input files')
+        state = StackState(io.read_header(idffiles[0]))
+        added = idffiles
+
+    for idffile in added:
+        with idf.IdfFile(idffile) as src:
+            if (src.header['nrow'], src.header['ncol']) != state.shape:
+                logging.warning('skipping {f:}, shape does not match'.format(
+                    f=idffile))
+                state.reject(idffile, fingerprints[idffile])
+                continue
+            state.add(idffile, src.read(masked=True), fingerprints[idffile])
+
+    io.write_array(outfile, state.result(method), dict(state.header))
+    state.save(statefile)
+    return {
+        'added': [f for f in added if f in state.inputs],
+        'removed': removed,
+        'changed': changed,
+        'rejected': sorted(state.rejected),
+        'recomputed': recompute,
+        }
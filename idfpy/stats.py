@@ -0,0 +1,285 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from idfpy import idf
+
+import numpy as np
+
+from concurrent.futures import ThreadPoolExecutor
+from statistics import NormalDist
+import glob
+import math
+
+
+PERCENTILES = (5., 25., 50., 75., 95.)
+
+
+class RunningStats(object):
+    """Streaming count, mean, variance, min and max of values
+
+    Blocks are combined with the pairwise update of Chan et al., which is
+    Welford's algorithm generalized to blocks of values, so the result
+    does not depend on block size and is stable for large counts.
+    """
+    def __init__(self):
+        self.count = 0
+        self.nodata = 0
+        self.mean = 0.
+        self.m2 = 0.
+        self.min = np.inf
+        self.max = -np.inf
+
+    def __repr__(self):
+        return ('{s.__class__.__name__:}(count={s.count:d}, '
+            'mean={s.mean:g}, std={s.std:g})').format(s=self)
+
+    @property
+    def var(self):
+        """population variance"""
+        if not self.count:
+            return np.nan
+        return self.m2 / self.count
+
+    @property
+    def std(self):
+        """population standard deviation"""
+        return math.sqrt(self.var)
+
+    def combine(self, count, mean, m2, vmin, vmax):
+        """combine with statistics of other set of values"""
+        if not count:
+            return
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta**2 * self.count * count / total
+        self.count = total
+        self.min = min(self.min, vmin)
+        self.max = max(self.max, vmax)
+
+    def add(self, values, nodata=0):
+        """add array of valid values and number of nodata cells"""
+        self.nodata += nodata
+        if not values.size:
+            return
+        mean = float(values.mean(dtype=np.float64))
+        m2 = float(np.sum(np.square(values - mean, dtype=np.float64)))
+        self.combine(values.size, mean, m2,
+            float(values.min()), float(values.max()))
+
+    def merge(self, other):
+        """merge other RunningStats into this one"""
+        self.nodata += other.nodata
+        self.combine(other.count, other.mean, other.m2, other.min, other.max)
+
+
+def split_valid(values, nodata):
+    '''valid values and number of nodata cells, NaN counts as nodata'''
+    is_valid = (values != nodata) & ~np.isnan(values)
+    valid = values[is_valid]
+    return valid, values.size - valid.size
+
+
+def histogram_percentiles(counts, edges, percentiles=PERCENTILES,
+        underflow=0, overflow=0):
+    '''percentiles from histogram, linear within bins
+
+    underflow and overflow are the numbers of values below and above the
+    histogram range. Percentiles are ranked against all values, those
+    outside the range are -inf or inf. Results are within one bin width
+    of the exact percentiles.
+    '''
+    inrange = counts.sum()
+    total = underflow + inrange + overflow
+    if not total:
+        return {q: np.nan for q in percentiles}
+    cumulative = np.concatenate([[0], np.cumsum(counts)])
+    result = {}
+    for q in percentiles:
+        target = q / 100. * total - underflow
+        if target < 0:
+            result[q] = -np.inf
+            continue
+        if target > inrange:
+            result[q] = np.inf
+            continue
+        i = int(np.searchsorted(cumulative, target, side='left'))
+        i = min(max(i, 1), len(counts))
+        inbin = counts[i - 1]
+        fraction = (target - cumulative[i - 1]) / inbin if inbin else 0.
+        result[q] = float(edges[i - 1] + fraction * (edges[i] - edges[i - 1]))
+    return result
+
+
+def refresh_header(idffile, dmin, dmax):
+    '''write dmin and dmax to header of Idf file in place'''
+    with idf.IdfFile(str(idffile), 'r+b') as dst:
+        dst.header['dmin'], dst.header['dmax'] = dmin, dmax
+        dst.write_header()
+
+
+def bin_range(low, high):
+    '''histogram range low, high, widened if low equals high'''
+    if low == high:
+        return low - 0.5, high + 0.5
+    return low, high
+
+
+def describe(idffile, bins=100, hist_range=None, percentiles=PERCENTILES,
+        blocksize=idf.BLOCKSIZE, refresh=False):
+    '''exact statistics of Idf file read in blocks of rows
+
+    Returns dict with count, nodata, min, max, mean, std, var, histogram
+    (counts and edges of bins), underflow and overflow (values outside the
+    bins) and percentiles from the histogram with percentile_error the bin
+    width. Histogram bins span hist_range in a single pass, or the data
+    range from a first pass if hist_range is None. Percentiles outside
+    hist_range are -inf or inf. Header dmin and dmax are updated in place
+    if refresh is True.
+    '''
+    idffile = str(idffile)
+    stats = RunningStats()
+    counts, edges = None, None
+    underflow, overflow = 0, 0
+    if bins and hist_range is not None:
+        hist_range = bin_range(*hist_range)
+        counts = np.zeros(bins, dtype=np.int64)
+    with idf.IdfFile(idffile) as src:
+        nodata = src.header['nodata']
+        for start, block in src.iter_blocks(blocksize=blocksize):
+            valid, nnodata = split_valid(block, nodata)
+            stats.add(valid, nnodata)
+            if counts is not None:
+                counts += np.histogram(valid, bins=bins, range=hist_range)[0]
+                underflow += int(np.count_nonzero(valid < hist_range[0]))
+                overflow += int(np.count_nonzero(valid > hist_range[1]))
+
+        if bins and stats.count and counts is None:
+            hist_range = bin_range(stats.min, stats.max)
+            counts = np.zeros(bins, dtype=np.int64)
+            for start, block in src.iter_blocks(blocksize=blocksize):
+                valid, _ = split_valid(block, nodata)
+                counts += np.histogram(valid, bins=bins, range=hist_range)[0]
+    if counts is not None and stats.count:
+        edges = np.linspace(hist_range[0], hist_range[1], bins + 1)
+    else:
+        counts = None
+
+    if refresh and stats.count:
+        refresh_header(idffile, stats.min, stats.max)
+
+    result = {
+        'count': stats.count,
+        'nodata': stats.nodata,
+        'min': stats.min if stats.count else np.nan,
+        'max': stats.max if stats.count else np.nan,
+        'mean': stats.mean if stats.count else np.nan,
+        'std': stats.std,
+        'var': stats.var,
+        'histogram': (counts, edges),
+        'underflow': underflow,
+        'overflow': overflow,
+        }
+    if counts is not None:
+        result['percentiles'] = histogram_percentiles(counts, edges,
+            percentiles, underflow=underflow, overflow=overflow)
+        result['percentile_error'] = float(edges[1] - edges[0])
+    return result
+
+
+def sample_rows(nrow, fraction=0.1, method='strided', seed=None):
+    '''sorted indices of a strided or random subset of rows'''
+    n = min(max(int(math.ceil(nrow * fraction)), 1), nrow)
+    if method == 'strided':
+        step = nrow / n
+        return np.floor((np.arange(n) + 0.5) * step).astype(np.int64)
+    elif method == 'random':
+        rng = np.random.default_rng(seed)
+        return np.sort(rng.choice(nrow, size=n, replace=False))
+    raise ValueError('method must be strided or random')
+
+
+def describe_sample(idffile, fraction=0.1, method='strided', seed=None,
+        percentiles=PERCENTILES, confidence=0.95):
+    '''approximate statistics of Idf file from a subset of rows
+
+    Rows are the sampling units, so the error of the mean is that of a
+    ratio estimator over sampled rows with finite population correction.
+    Percentiles are sample percentiles; percentile_rank_error bounds the
+    error in their rank (fraction of cells) by the Dvoretzky-Kiefer-
+    Wolfowitz inequality. min and max are those of the sample, the exact
+    values are outside or equal to them. Errors hold at the given
+    confidence level.
+    '''
+    with idf.IdfFile(str(idffile)) as src:
+        nrow, ncol = src.header['nrow'], src.header['ncol']
+        nodata = src.header['nodata']
+        rows = sample_rows(nrow, fraction=fraction, method=method, seed=seed)
+        sums = np.zeros(len(rows))
+        counts = np.zeros(len(rows))
+        samples = []
+        for i, row in enumerate(rows):
+            valid, _ = split_valid(src.read_rows(row, row + 1), nodata)
+            sums[i] = valid.sum(dtype=np.float64)
+            counts[i] = valid.size
+            samples.append(valid)
+    values = np.concatenate(samples).astype(np.float64)
+
+    n = len(rows)
+    z = NormalDist().inv_cdf(0.5 + confidence / 2.)
+    result = {
+        'rows': n,
+        'count': int(round(counts.mean() * nrow)),
+        'nodata': int(round((ncol - counts.mean()) * nrow)),
+        'min': np.nan,
+        'max': np.nan,
+        'mean': np.nan,
+        'mean_error': np.nan,
+        'std': np.nan,
+        'percentiles': {q: np.nan for q in percentiles},
+        'percentile_rank_error': np.nan,
+        'confidence': confidence,
+        }
+    if not values.size:
+        return result
+
+    mean = sums.sum() / counts.sum()
+    if n > 1:
+        residuals = sums - mean * counts
+        variance = ((1. - n / nrow) * np.sum(residuals**2) / (n - 1) /
+            (n * counts.mean()**2))
+        mean_error = z * math.sqrt(max(variance, 0.))
+    else:
+        mean_error = np.inf
+    qs = np.percentile(values, percentiles)
+    result.update(
+        min=float(values.min()),
+        max=float(values.max()),
+        mean=float(mean),
+        mean_error=float(mean_error),
+        std=float(values.std()),
+        percentiles={q: float(v) for q, v in zip(percentiles, qs)},
+        percentile_rank_error=math.sqrt(
+            math.log(2. / (1. - confidence)) / (2. * values.size)),
+        )
+    return result
+
+
+def describe_files(idffiles, fraction=None, workers=None, **kwargs):
+    '''statistics of Idf files (list or glob pattern) in parallel
+
+    Exact statistics by default, approximate from a fraction of rows if
+    fraction is given. Returns dict of filename and statistics.
+    '''
+    if isinstance(idffiles, str):
+        idffiles = sorted(glob.glob(idffiles))
+    idffiles = [str(f) for f in idffiles]
+
+    def process(idffile):
+        if fraction is not None:
+            return describe_sample(idffile, fraction=fraction, **kwargs)
+        return describe(idffile, **kwargs)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return dict(zip(idffiles, executor.map(process, idffiles)))
@@ -0,0 +1,118 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from idfpy import archive
+from idfpy import idf
+from idfpy import io
+
+import numpy as np
+import pytest
+
+from io import BytesIO
+import mmap
+import shutil
+import os
+import tarfile
+import zipfile
+
+
+@pytest.fixture
+def sourcefile(tmpdir):
+    datadir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+    sourcefilename = r'bxk1-d-ck.idf'
+    sourcefile = os.path.join(datadir, sourcefilename)
+    testfile = tmpdir.join(sourcefilename)
+    shutil.copyfile(sourcefile, testfile)
+    return str(testfile)
+
+
+def test_read_bytesio(sourcefile):
+    with open(sourcefile, 'rb') as f:
+        buffer = BytesIO(f.read())
+    with idf.IdfFile(buffer) as src:
+        values = src.read()
+        rows = src.read_rows(3, 9)
+    assert not buffer.closed
+    expected = io.read_array(sourcefile, masked=False)
+    assert np.array_equal(values, expected)
+    assert np.array_equal(rows, expected[3:9])
+
+
+def test_closefd(sourcefile):
+    with open(sourcefile, 'rb') as f:
+        buffer = BytesIO(f.read())
+    with idf.IdfFile(buffer, closefd=True) as src:
+        src.read()
+    assert buffer.closed
+
+
+def test_read_mmap(sourcefile):
+    with open(sourcefile, 'rb') as f, \
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        with idf.IdfFile(mm) as src:
+            values = src.read()
+    assert np.array_equal(values, io.read_array(sourcefile, masked=False))
+
+
+def test_write_bytesio(sourcefile):
+    array = io.read_array(sourcefile)
+    header = io.read_header(sourcefile)
+    buffer = BytesIO()
+    with idf.IdfFile(buffer, 'wb', header.copy()) as dst:
+        dst.write(array)
+    buffer.seek(0)
+    with idf.IdfFile(buffer) as src:
+        assert np.array_equal(src.read(), array.filled())
+
+
+def test_read_truncated(sourcefile):
+    with open(sourcefile, 'rb') as f:
+        buffer = BytesIO(f.read()[:-4])
+    with idf.IdfFile(buffer) as src:
+        with pytest.raises(IOError):
+            src.read()
+
+
+@pytest.mark.parametrize('compression', [
+    zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED])
+def test_zip_archive(sourcefile, tmpdir, compression):
+    zippath = str(tmpdir.join('run.zip'))
+    with zipfile.ZipFile(zippath, 'w', compression=compression) as zf:
+        zf.write(sourcefile, 'head/head_l1.idf')
+        zf.write(sourcefile, 'head/head_l2.IDF')
+        zf.writestr('readme.txt', 'model run')
+    expected = io.read_array(sourcefile, masked=False)
+
+    assert archive.list_idfs(zippath) == [
+        'head/head_l1.idf', 'head/head_l2.IDF']
+    with archive.IdfArchive(zippath) as arc:
+        assert arc.is_stored('head/head_l1.idf') == (
+            compression == zipfile.ZIP_STORED)
+        assert arc.read_header('head/head_l1.idf') == \
+            io.read_header(sourcefile)
+        with arc.open('head/head_l2.IDF') as src:
+            assert np.array_equal(src.read_rows(10, 20), expected[10:20])
+            assert src.read_cell(12, 7) == expected[12, 7]
+    assert np.array_equal(archive.read_array(zippath, 'head/head_l1.idf',
+        masked=False), expected)
+
+
+@pytest.mark.parametrize('mode', ['w', 'w:gz'])
+def test_tar_archive(sourcefile, tmpdir, mode):
+    tarpath = str(tmpdir.join('run.tar'))
+    with tarfile.open(tarpath, mode) as tf:
+        tf.add(sourcefile, 'head_l1.idf')
+    expected = io.read_array(sourcefile, masked=False)
+
+    with archive.IdfArchive(tarpath) as arc:
+        assert arc.names() == ['head_l1.idf']
+        assert arc.is_stored('head_l1.idf') == (mode == 'w')
+        with arc.open('head_l1.idf') as src:
+            assert np.array_equal(src.read_rows(5, 8), expected[5:8])
+            assert np.array_equal(src.read(), expected)
+
+
+def test_not_an_archive(sourcefile):
+    with pytest.raises(ValueError):
+        archive.IdfArchive(sourcefile)
@@ -0,0 +1,91 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from idfpy import asciigrid
+import idfpy
+
+import numpy as np
+import pytest
+
+import shutil
+import os
+
+
+@pytest.fixture
+def sourcefile(tmpdir):
+    datadir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+    sourcefilename = r'bxk1-d-ck.idf'
+    sourcefile = os.path.join(datadir, sourcefilename)
+    testfile = tmpdir.join(sourcefilename)
+    shutil.copyfile(sourcefile, testfile)
+    return testfile
+
+
+def test_idf2asc(sourcefile, tmpdir):
+    ascfile = str(tmpdir.join('bxk1-d-ck.asc'))
+    asciigrid.idf2asc(str(sourcefile), ascfile, decimals=4, blocksize=10)
+
+    with open(ascfile) as f:
+        lines = f.read().splitlines()
+    assert lines[0] == 'ncols 88'
+    assert lines[1] == 'nrows 66'
+    assert lines[4] == 'cellsize 100.0'
+    assert lines[5] == 'NODATA_value -9999.0000'
+    assert len(lines) == 6 + 66
+
+    with idfpy.open(sourcefile) as src:
+        source = src.read(masked=True)
+    values, header = asciigrid.read_asc(ascfile)
+    assert header['ncol'] == 88
+    assert header['nrow'] == 66
+    assert np.isclose(header['ymax'], 489200.)
+    np.testing.assert_array_equal(values.mask, source.mask)
+    np.testing.assert_allclose(values, source, atol=1e-4)
+
+
+def test_asc2idf(sourcefile, tmpdir):
+    ascfile = str(tmpdir.join('bxk1-d-ck.asc'))
+    idffile = str(tmpdir.join('bxk1-d-ck_asc.idf'))
+    asciigrid.idf2asc(str(sourcefile), ascfile, decimals=6)
+    asciigrid.asc2idf(ascfile, idffile, blocksize=7)
+
+    with idfpy.open(sourcefile) as src:
+        source = src.read(masked=True)
+        header = src.header
+    with idfpy.open(idffile) as cpy:
+        copy = cpy.read(masked=True)
+        copy_header = cpy.header
+    np.testing.assert_allclose(copy, source, atol=1e-6)
+    assert np.isclose(copy_header['dmin'], header['dmin'])
+    assert np.isclose(copy_header['dmax'], header['dmax'])
+
+
+def test_asc_nodata(sourcefile, tmpdir):
+    ascfile = str(tmpdir.join('bxk1-d-ck.asc'))
+    asciigrid.idf2asc(str(sourcefile), ascfile, decimals=2, nodata=-1.)
+    values, header = asciigrid.read_asc(ascfile)
+    assert header['nodata'] == -1.
+    with idfpy.open(sourcefile) as src:
+        source = src.read(masked=True)
+    np.testing.assert_array_equal(values.mask, source.mask)
+
+
+def test_idf2xyz(sourcefile, tmpdir):
+    xyzfile = str(tmpdir.join('bxk1-d-ck.csv'))
+    asciigrid.idf2xyz(str(sourcefile), xyzfile, decimals=4)
+    x, y, z = asciigrid.read_xyz(xyzfile)
+
+    with idfpy.open(sourcefile) as src:
+        source = src.read(masked=True)
+        values = [v for v, in src.sample(zip(x[:10], y[:10]))]
+    assert len(z) == source.count()
+    np.testing.assert_allclose(z[:10], values, atol=1e-4)
+    assert np.isclose(z.mean(), source.mean(), atol=1e-4)
+
+
+def test_format_blocksize():
+    assert asciigrid.format_blocksize(88) == 256
+    assert asciigrid.format_blocksize(20000) == 13
+    assert asciigrid.format_blocksize(10**6) == 1
+    assert asciigrid.format_blocksize(88, blocksize=10) == 10
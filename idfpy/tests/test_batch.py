@@ -0,0 +1,124 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from idfpy import asciigrid
+from idfpy import batch
+import idfpy
+
+import numpy as np
+import pytest
+
+import json
+import shutil
+import os
+
+
+@pytest.fixture
+def sourcedir(tmpdir):
+    datadir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+    sourcefile = os.path.join(datadir, r'bxk1-d-ck.idf')
+    for i in range(3):
+        shutil.copyfile(sourcefile, tmpdir.join('bxk1-{:d}.idf'.format(i)))
+    return tmpdir
+
+
+def test_parse_line():
+    job = batch.parse_line(
+        'clip bxk1-*.idf "clip/{stem}.idf" bounds=[252000,483000,254000,485000]')
+    assert job == {
+        'op': 'clip',
+        'input': 'bxk1-*.idf',
+        'output': 'clip/{stem}.idf',
+        'bounds': [252000, 483000, 254000, 485000],
+        }
+
+
+def test_plan(sourcedir):
+    jobs = [
+        {'op': 'convert', 'input': 'bxk1-*.idf', 'format': 'asc'},
+        {'op': 'sample', 'input': 'bxk1-0.idf', 'coords': [[256060., 483140.]]},
+        {'op': 'stack', 'input': 'bxk1-*.idf', 'output': 'mean.idf'},
+        ]
+    tasks, usage = batch.plan(jobs, path=str(sourcedir))
+    assert len(tasks) == 5
+    assert tasks[-1].op == 'stack'
+    assert usage[os.path.join(str(sourcedir), 'bxk1-0.idf')] == 2
+    assert tasks[0].output == os.path.join(str(sourcedir), 'bxk1-0.asc')
+
+
+def test_plan_duplicate_output(sourcedir):
+    jobs = [{'op': 'clip', 'input': 'bxk1-*.idf', 'output': 'clip.idf',
+        'bounds': [252000, 483000, 254000, 485000]}]
+    with pytest.raises(ValueError):
+        batch.plan(jobs, path=str(sourcedir))
+
+
+def test_run_reads_once(sourcedir):
+    jobs = [
+        {'op': 'convert', 'input': 'bxk1-*.idf', 'format': 'asc'},
+        {'op': 'convert', 'input': 'bxk1-*.idf', 'format': 'xyz'},
+        {'op': 'sample', 'input': 'bxk1-*.idf',
+            'coords': [[256060., 483140.], [260310., 486450.]]},
+        {'op': 'clip', 'input': 'bxk1-0.idf', 'output': 'clip.idf',
+            'bounds': [252000, 483000, 254000, 485000]},
+        {'op': 'stack', 'input': 'bxk1-*.idf', 'output': 'mean.idf'},
+        ]
+    tasks, usage = batch.plan(jobs, path=str(sourcedir))
+    cache = batch.ArrayCache(usage)
+    for task in tasks:
+        if task.op == 'stack':  # per-file inputs released before stack
+            assert not cache._items
+        batch.OPERATIONS[task.op](task, cache)
+        if task.op in batch.PER_FILE:
+            for inputfile in task.inputs:
+                cache.release(inputfile)
+    assert set(cache.reads.values()) == {1}
+    assert not cache._items
+
+    with idfpy.open(sourcedir.join('bxk1-0.idf')) as src:
+        source = src.read(masked=True)
+    with idfpy.open(sourcedir.join('mean.idf')) as src:
+        np.testing.assert_allclose(src.read(masked=True), source)
+    with idfpy.open(sourcedir.join('clip.idf')) as src:
+        assert src.header['ncol'] == 20
+        assert src.header['nrow'] == 20
+        assert np.isclose(src.header['xmin'], 252000.)
+        assert np.isclose(src.header['ymin'], 483000.)
+        np.testing.assert_allclose(src.read(masked=True),
+            source[42:62, 5:25])
+
+    values, _ = asciigrid.read_asc(str(sourcedir.join('bxk1-1.asc')))
+    np.testing.assert_allclose(values, source, atol=1e-3)
+    with open(str(sourcedir.join('bxk1-2_sample.csv'))) as f:
+        lines = f.read().splitlines()
+    assert lines[0] == 'x,y,value'
+    assert np.isclose(float(lines[1].split(',')[2]), 3.6234)
+    assert lines[2].endswith('nan')
+
+
+def test_run_jobfile(sourcedir):
+    jobfile = str(sourcedir.join('jobs.json'))
+    with open(jobfile, 'w') as f:
+        json.dump({'jobs': [
+            {'op': 'convert', 'input': 'bxk1-*.idf', 'format': 'idf',
+                'output': 'copy/{stem}.idf'},
+            {'op': 'stack', 'input': 'bxk1-*.idf', 'output': 'max.idf',
+                'method': 'max'},
+            ]}, f)
+    results = batch.run_jobs(batch.read_jobs(jobfile), path=str(sourcedir),
+        workers=2)
+    assert len(results) == 4
+    assert all(error is None for task, error in results)
+    assert sourcedir.join('copy', 'bxk1-2.idf').check()
+    assert sourcedir.join('max.idf').check()
+
+
+def test_run_stack_percentile(sourcedir):
+    jobs = [{'op': 'stack', 'input': 'bxk1-*.idf', 'output': 'p90.idf',
+        'method': 'percentile', 'q': 90., 'tilesize': 10}]
+    results = batch.run_jobs(jobs, path=str(sourcedir))
+    assert all(error is None for task, error in results)
+    source = idfpy.read(str(sourcedir.join('bxk1-0.idf')), masked=True)
+    result = idfpy.read(str(sourcedir.join('p90.idf')), masked=True)
+    np.testing.assert_allclose(result.filled(-9999.), source.filled(-9999.))
@@ -0,0 +1,105 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from idfpy import calc
+from idfpy import idf
+from idfpy import io
+
+import numpy as np
+import pytest
+
+import os
+
+
+@pytest.fixture
+def sourcefiles(tmpdir):
+    datadir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+    sourcefile = os.path.join(datadir, r'bxk1-d-ck.idf')
+    source = io.read_array(sourcefile)
+    header = io.read_header(sourcefile)
+    rng = np.random.RandomState(1)
+    sourcefiles = []
+    for i in range(7):
+        testfile = str(tmpdir.join('bxk1-{:d}.idf'.format(i)))
+        array = source + rng.normal(size=source.shape).astype(np.float32)
+        array[rng.uniform(size=source.shape) < 0.1] = np.ma.masked
+        io.write_array(testfile, array, header.copy())
+        sourcefiles.append(testfile)
+    return sourcefiles
+
+
+def stacked(idffiles):
+    return np.ma.stack([io.read_array(f) for f in idffiles]).filled(np.nan)
+
+
+def test_reduce_nth():
+    values = np.array([1., 5., np.nan, 3.])
+    assert calc.reduce(values, 'nthmax', n=1) == 5.
+    assert calc.reduce(values, 'nthmax', n=3) == 1.
+    assert np.isnan(calc.reduce(values, 'nthmax', n=4))
+    assert calc.reduce(values, 'nthmin', n=2) == 3.
+    assert calc.reduce(values, 'meanmax', n=2) == 4.
+    assert calc.reduce(values, 'meanmin', n=5) == 3.
+    assert np.isnan(calc.reduce(np.full(3, np.nan), 'sum'))
+
+
+@pytest.mark.parametrize('method,kwargs,func', [
+    ('median', {}, lambda v: np.nanmedian(v, axis=0)),
+    ('std', {}, lambda v: np.nanstd(v, axis=0)),
+    ('percentile', {'q': 90.}, lambda v: np.nanpercentile(v, 90., axis=0)),
+    ('nthmax', {'n': 2}, lambda v: -np.sort(-np.where(np.isnan(v), -np.inf, v),
+        axis=0)[1]),
+    ])
+@pytest.mark.filterwarnings('ignore::RuntimeWarning')
+def test_stack_agg(sourcefiles, method, kwargs, func):
+    result = calc.stack_agg(sourcefiles, method=method, tilesize=10,
+        workers=3, **kwargs)
+    values = stacked(sourcefiles)
+    expected = np.ma.masked_invalid(func(values))
+    expected = np.ma.masked_where(np.isinf(expected), expected)
+    np.testing.assert_array_equal(result.mask, expected.mask)
+    np.testing.assert_allclose(result.compressed(), expected.compressed(),
+        rtol=1e-5)
+
+
+def test_stack_agg_mean(sourcefiles):
+    result = calc.stack_agg(sourcefiles, method='mean', tilesize=16)
+    expected = calc.agg(*(io.read_array(f) for f in sourcefiles),
+        method='mean')
+    np.testing.assert_array_equal(result.mask, expected.mask)
+    np.testing.assert_allclose(result.compressed(), expected.compressed(),
+        rtol=1e-5)
+
+
+def test_stack_agg_double(sourcefiles, tmpdir):
+    # nodata that is not exact in float32
+    expected = io.read_array(sourcefiles[0]).astype(np.float64)
+    expected.fill_value = 0.1
+    idffile = str(tmpdir.join('double.idf'))
+    with idf.IdfFile(idffile, 'wb', io.read_header(sourcefiles[0]),
+            dtype='>f8') as dst:
+        dst.write(expected)
+    result = calc.stack_agg([idffile], method='max')
+    assert result.dtype == np.float64
+    np.testing.assert_array_equal(result.mask, expected.mask)
+    np.testing.assert_array_equal(result.compressed(), expected.compressed())
+
+
+@pytest.mark.parametrize('method', ['sum', 'mean', 'std'])
+def test_stack_agg_double_precision(sourcefiles, tmpdir, method):
+    header = io.read_header(sourcefiles[0])
+    rng = np.random.RandomState(2)
+    arrays = []
+    idffiles = []
+    for i in range(3):
+        array = 1e4 + rng.uniform(size=(header['nrow'], header['ncol']))
+        idffile = str(tmpdir.join('double-{:d}.idf'.format(i)))
+        with idf.IdfFile(idffile, 'wb', header.copy(), dtype='>f8') as dst:
+            dst.write(array)
+        arrays.append(array)
+        idffiles.append(idffile)
+    result = calc.stack_agg(idffiles, method=method)
+    assert result.dtype == np.float64
+    expected = getattr(np, method)(np.stack(arrays), axis=0)
+    np.testing.assert_allclose(result, expected, rtol=1e-12)
@@ -0,0 +1,97 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from idfpy import io
+import idfpy
+
+import numpy as np
+import pytest
+
+import shutil
+import os
+
+pytest.importorskip('dask.array')
+pytest.importorskip('xarray')
+
+from idfpy import chunked  # noqa: E402
+
+
+@pytest.fixture
+def sourcefile(tmpdir):
+    datadir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+    sourcefilename = r'bxk1-d-ck.idf'
+    sourcefile = os.path.join(datadir, sourcefilename)
+    testfile = tmpdir.join(sourcefilename)
+    shutil.copyfile(sourcefile, testfile)
+    return testfile
+
+
+def test_to_dask(sourcefile):
+    values = chunked.to_dask(sourcefile, chunks=20)
+    assert values.chunks == ((20, 20, 20, 6), (88, ))
+    with idfpy.open(sourcefile) as src:
+        source = src.read(masked=True)
+    np.testing.assert_array_equal(values.compute(), source.filled(np.nan))
+    assert np.isclose(float(np.nanmean(values).compute()), 2.71736125)
+
+
+def test_to_dask_double(sourcefile, tmpdir):
+    idffile = str(tmpdir.join('double.idf'))
+    with idfpy.open(sourcefile) as src:
+        source = src.read(masked=True)
+        with idfpy.open(idffile, 'wb', header=src.header.copy(),
+                dtype='>f8') as dst:
+            dst.write(source)
+    values = chunked.to_dask(idffile, chunks=20)
+    assert values.dtype == np.dtype('=f8')
+    assert values.compute().dtype == values.dtype
+    np.testing.assert_array_equal(values.compute(), source.filled(np.nan))
+
+
+def test_open_dataarray(sourcefile):
+    data = chunked.open_dataarray(sourcefile, chunks=16)
+    assert data.dims == ('y', 'x')
+    assert np.isclose(data.x[0], 251550.)
+    assert np.isclose(data.y[0], 489150.)
+    value = data.sel(x=256060., y=483140., method='nearest')
+    assert np.isclose(float(value), 3.6234)
+
+
+def test_open_dataarray_nonequidistant(sourcefile, tmpdir):
+    header = io.read_header(sourcefile)
+    header['ieq'] = True
+    header['dx(col)'] = tuple(float(50 + c) for c in range(header['ncol']))
+    header['dy(row)'] = tuple(100. for r in range(header['nrow']))
+    del header['dx'], header['dy']
+    idffile = str(tmpdir.join('ieq.idf'))
+    io.write_array(idffile, io.read_array(sourcefile), header)
+
+    data = chunked.open_dataarray(idffile)
+    np.testing.assert_allclose(data.dx, header['dx(col)'])
+    assert np.isclose(data.x[1], 251500. + 50. + 51. / 2.)
+    np.testing.assert_array_equal(data.values,
+        io.read_array(sourcefile).filled(np.nan))
+
+
+def test_open_mfdataarray(sourcefile, tmpdir):
+    header = io.read_header(sourcefile)
+    source = io.read_array(sourcefile)
+    for i in range(3):
+        io.write_array(str(tmpdir.join('layer_{:d}.idf'.format(i))),
+            source + i, header.copy())
+    data = chunked.open_mfdataarray(str(tmpdir.join('layer_*.idf')))
+    assert data.shape == (3, 66, 88)
+    assert list(data.file.values) == ['layer_0', 'layer_1', 'layer_2']
+    np.testing.assert_allclose(data.mean('file').values,
+        (source + 1.).filled(np.nan), rtol=1e-6)
+
+
+def test_open_mfdataarray_mismatch(sourcefile, tmpdir):
+    header = io.read_header(sourcefile)
+    source = io.read_array(sourcefile)
+    io.write_array(str(tmpdir.join('layer_0.idf')), source, header.copy())
+    header['dx'] = 50.
+    io.write_array(str(tmpdir.join('layer_1.idf')), source, header.copy())
+    with pytest.raises(ValueError):
+        chunked.open_mfdataarray(str(tmpdir.join('layer_*.idf')))
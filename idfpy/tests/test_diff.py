@@ -0,0 +1,106 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from idfpy import diff
+from idfpy import io
+
+import numpy as np
+import pytest
+
+import shutil
+import os
+
+
+@pytest.fixture
+def sourcefile(tmpdir):
+    datadir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+    sourcefilename = r'bxk1-d-ck.idf'
+    sourcefile = os.path.join(datadir, sourcefilename)
+    testfile = tmpdir.join(sourcefilename)
+    shutil.copyfile(sourcefile, testfile)
+    return str(testfile)
+
+
+def changed_copy(sourcefile, outfile, index, delta):
+    array = io.read_array(sourcefile, masked=False)
+    header = io.read_header(sourcefile)
+    nodata = header['nodata']
+    rows, cols = np.nonzero(array != nodata)
+    row, col = rows[index], cols[index]
+    array[row, col] += delta
+    io.write_array(outfile, np.ma.masked_values(array, nodata), header)
+    return row, col
+
+
+def test_diff_identical(sourcefile, tmpdir):
+    copyfile = str(tmpdir.join('copy.idf'))
+    shutil.copyfile(sourcefile, copyfile)
+    result = diff.diff(sourcefile, copyfile, blocksize=16)
+    assert result['equal']
+    assert result['identical']
+    assert result['nchanged'] == 0
+    assert result['bbox'] is None
+    assert diff.is_equal(sourcefile, copyfile)
+
+
+def test_diff_changed(sourcefile, tmpdir):
+    otherfile = str(tmpdir.join('other.idf'))
+    row, col = changed_copy(sourcefile, otherfile, 10, 1.)
+    result = diff.diff(sourcefile, otherfile, blocksize=16)
+    assert not result['equal']
+    assert result['nchanged'] == 1
+    assert result['nodata_changed'] == 0
+    assert result['max_abs_diff'] == pytest.approx(1., abs=1e-3)
+    assert result['bbox'] == (row, row + 1, col, col + 1)
+    xmin, ymin, xmax, ymax = result['bounds']
+    assert xmin < xmax and ymin < ymax
+
+    # within tolerance
+    assert diff.is_equal(sourcefile, otherfile, atol=1.01)
+    assert not diff.is_equal(sourcefile, otherfile, atol=0.5)
+
+
+def test_diff_quick(sourcefile, tmpdir):
+    otherfile = str(tmpdir.join('other.idf'))
+    changed_copy(sourcefile, otherfile, 0, 1.)
+    result = diff.diff(sourcefile, otherfile, quick=True, blocksize=1)
+    assert not result['equal']
+    assert not result['complete']
+
+
+def test_diff_outfile(sourcefile, tmpdir):
+    otherfile = str(tmpdir.join('other.idf'))
+    outfile = str(tmpdir.join('diff.idf'))
+    row, col = changed_copy(sourcefile, otherfile, 5, -2.)
+    diff.diff(otherfile, sourcefile, outfile=outfile, blocksize=16)
+    difference = io.read_array(outfile)
+    assert difference[row, col] == pytest.approx(-2., abs=1e-3)
+    difference[row, col] = 0.
+    assert np.all(difference.compressed() == 0.)
+    assert np.all(difference.mask == io.read_array(sourcefile).mask)
+
+
+def test_diff_dirs(sourcefile, tmpdir):
+    dir_a, dir_b = tmpdir.mkdir('a'), tmpdir.mkdir('b')
+    for name in ('one.idf', 'two.idf', 'three.idf'):
+        shutil.copyfile(sourcefile, str(dir_a.join(name)))
+    shutil.copyfile(sourcefile, str(dir_b.join('one.idf')))
+    changed_copy(sourcefile, str(dir_b.join('two.idf')), 0, 1.)
+    results = diff.diff_dirs(str(dir_a), str(dir_b), workers=2)
+    assert results['one.idf']['equal']
+    assert not results['two.idf']['equal']
+    assert results['three.idf'] is None
+
+
+def test_diff_georeference(sourcefile, tmpdir):
+    shiftedfile = str(tmpdir.join('shifted.idf'))
+    array = io.read_array(sourcefile)
+    header = io.read_header(sourcefile)
+    header['xmin'] += 100.
+    io.write_array(shiftedfile, array, header)
+    result = diff.diff(sourcefile, shiftedfile)
+    assert 'xmin' in result['header']
+    assert result['nchanged'] == 0
+    assert not result['equal']
+    assert not diff.is_equal(sourcefile, shiftedfile)
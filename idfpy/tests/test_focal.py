@@ -0,0 +1,93 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from idfpy import focal
+from idfpy import idf
+from idfpy import io
+
+import numpy as np
+import pytest
+
+import shutil
+import os
+
+
+@pytest.fixture
+def sourcefile(tmpdir):
+    datadir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+    sourcefilename = r'bxk1-d-ck.idf'
+    sourcefile = os.path.join(datadir, sourcefilename)
+    testfile = tmpdir.join(sourcefilename)
+    shutil.copyfile(sourcefile, testfile)
+    return str(testfile)
+
+
+def brute_force(values, size, func):
+    half = size // 2
+    padded = np.pad(values, half, constant_values=np.nan)
+    result = np.empty(values.shape)
+    for r in range(values.shape[0]):
+        for c in range(values.shape[1]):
+            window = padded[r:r + size, c:c + size]
+            result[r, c] = func(window) if np.any(~np.isnan(window)) \
+                else np.nan
+    return result
+
+
+@pytest.mark.parametrize('method,func', [
+    ('mean', np.nanmean),
+    ('sum', np.nansum),
+    ('max', np.nanmax),
+    ('min', np.nanmin),
+    ])
+def test_moving_window(method, func):
+    rng = np.random.RandomState(1)
+    values = rng.normal(size=(12, 9))
+    values[rng.uniform(size=values.shape) < 0.2] = np.nan
+    result = focal.moving_window(values, size=5, method=method, fill=True)
+    np.testing.assert_allclose(result, brute_force(values, 5, func))
+    result = focal.moving_window(values, size=5, method=method)
+    assert np.all(np.isnan(result[np.isnan(values)]))
+
+
+def test_gradient_nonequidistant():
+    x = np.cumsum([10., 20., 40., 80.])
+    y = -np.cumsum([5., 5., 10.])
+    xx, yy = np.meshgrid(x, y)
+    values = 2. * xx - 3. * yy
+    dzdx, dzdy = focal.gradient(values, x, y)
+    np.testing.assert_allclose(dzdx, 2.)
+    np.testing.assert_allclose(dzdy, -3.)
+    np.testing.assert_allclose(focal.slope(values, x, y),
+        np.degrees(np.arctan(np.hypot(2., 3.))))
+    np.testing.assert_allclose(focal.aspect(values, x, y),
+        np.degrees(np.arctan2(-2., 3.)) % 360.)
+
+    values = xx ** 2 + yy ** 2
+    laplacian = focal.laplacian(values, x, y)
+    np.testing.assert_allclose(laplacian[1:-1, 1:-1], 4.)
+    assert np.all(np.isnan(laplacian[0]))
+
+
+@pytest.mark.parametrize('operator,size', [
+    ('mean', 7),
+    ('max', 3),
+    ('slope', 3),
+    ('laplacian', 3),
+    ])
+def test_apply(sourcefile, tmpdir, operator, size):
+    outfile = str(tmpdir.join('focal.idf'))
+    focal.apply(sourcefile, outfile, operator=operator, size=size,
+        blocksize=5, workers=3)
+
+    header = io.read_header(sourcefile)
+    values = io.read_array(sourcefile).filled(np.nan)
+    x, y = idf.cell_centers(header)
+    expected = np.ma.masked_invalid(focal.focal(values, x, y,
+        operator=operator, size=size))
+    result = io.read_array(outfile)
+    np.testing.assert_array_equal(result.mask, expected.mask)
+    np.testing.assert_allclose(result.compressed(), expected.compressed(),
+        rtol=1e-5)
+    assert np.isclose(io.read_header(outfile)['dmax'], expected.max())
@@ -0,0 +1,55 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+import json
+import os
+import subprocess
+import sys
+
+
+# modules not loaded by import idfpy and reading a header
+HEAVY_MODULES = ('numpy', 'rasterio', 'click')
+
+SCRIPT = '''
+import json, sys
+heavy = sys.argv[2].split(',')
+import idfpy
+imported = [m for m in heavy if m in sys.modules]
+header = idfpy.open(sys.argv[1]).header
+loaded = [m for m in heavy if m in sys.modules]
+print(json.dumps({'imported': imported, 'loaded': loaded,
+    'ncol': header['ncol']}))
+'''
+
+THREADED_SCRIPT = '''
+import sys
+from concurrent.futures import ThreadPoolExecutor
+import idfpy
+with ThreadPoolExecutor(max_workers=16) as executor:
+    arrays = list(executor.map(idfpy.read, [sys.argv[1]] * 16))
+print(len(arrays))
+'''
+
+
+def run_script(script):
+    idffile = os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'data', 'bxk1-d-ck.idf')
+    package_dir = os.path.dirname(os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))))
+    env = dict(os.environ, PYTHONPATH=package_dir)
+    output = subprocess.check_output(
+        [sys.executable, '-c', script, idffile, ','.join(HEAVY_MODULES)],
+        env=env)
+    return json.loads(output)
+
+
+def test_header_only_imports():
+    result = run_script(SCRIPT)
+    assert result['ncol'] == 88
+    assert result['imported'] == []
+    assert result['loaded'] == []
+
+
+def test_threaded_first_read():
+    assert run_script(THREADED_SCRIPT) == 16
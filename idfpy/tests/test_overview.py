@@ -0,0 +1,99 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from idfpy import overview
+import idfpy
+
+import numpy as np
+import pytest
+
+import glob
+import shutil
+import os
+
+
+@pytest.fixture
+def sourcefile(tmpdir):
+    datadir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+    sourcefilename = r'bxk1-d-ck.idf'
+    sourcefile = os.path.join(datadir, sourcefilename)
+    testfile = tmpdir.join(sourcefilename)
+    shutil.copyfile(sourcefile, testfile)
+    return str(testfile)
+
+
+def test_build_overviews(sourcefile):
+    ovrfiles = overview.build_overviews(sourcefile, factors=(2, 4, 8),
+        blocksize=10)
+    assert ovrfiles == [overview.overview_file(sourcefile, f)
+        for f in (2, 4, 8)]
+    assert glob.glob(os.path.join(os.path.dirname(sourcefile), '*.idf')) == [
+        sourcefile]
+
+    with idfpy.open(sourcefile) as src:
+        source = src.read(masked=True)
+    with idfpy.open(ovrfiles[1]) as ovr:
+        assert ovr.header['nrow'] == 17
+        assert ovr.header['ncol'] == 22
+        assert np.isclose(ovr.header['dx'], 400.)
+        assert np.isclose(ovr.header['ymin'], 489200. - 17 * 400.)
+        values = ovr.read(masked=True)
+    assert np.isclose(values[3, 5], source[12:16, 20:24].mean())
+    assert np.isclose(ovr.header['dmax'], values.max())
+
+
+def test_build_overviews_nearest(sourcefile):
+    ovrfile, = overview.build_overviews(sourcefile, factors=(4, ),
+        method='nearest')
+    with idfpy.open(sourcefile) as src:
+        source = src.read()
+    with idfpy.open(ovrfile) as ovr:
+        values = ovr.read()
+    np.testing.assert_array_equal(values[:16], source[2::4, 2::4][:16])
+
+
+def test_find_overviews(sourcefile):
+    overview.build_overviews(sourcefile, factors=(2, 4))
+    assert sorted(overview.find_overviews(sourcefile)) == [2, 4]
+    assert overview.best_overview(sourcefile, 3)[0] == 2
+    assert overview.best_overview(sourcefile, 1)[0] == 1
+
+    # overviews older than source are invalid
+    future = os.path.getmtime(sourcefile) + 10.
+    os.utime(sourcefile, (future, future))
+    assert overview.find_overviews(sourcefile) == {}
+
+
+def test_read_out_shape(sourcefile):
+    with idfpy.open(sourcefile) as src:
+        source = src.read(masked=True)
+        full = src.read(masked=True, out_shape=(16, 22))
+    rows = ((np.arange(16) + 0.5) * 66 / 16).astype(int)
+    cols = ((np.arange(22) + 0.5) * 88 / 22).astype(int)
+    np.testing.assert_array_equal(full, source[np.ix_(rows, cols)])
+
+    # nearest overview picks center cell of each 4 x 4 window
+    overview.build_overviews(sourcefile, factors=(4, ), method='nearest')
+    with idfpy.open(sourcefile) as src:
+        values = src.read(masked=True, out_shape=(16, 22))
+    rows = np.minimum(rows // 4 * 4 + 2, 65)
+    cols = np.minimum(cols // 4 * 4 + 2, 87)
+    np.testing.assert_array_equal(values, source[np.ix_(rows, cols)])
+
+
+@pytest.mark.parametrize('build', [False, True])
+def test_read_out_shape_dtype(sourcefile, build):
+    if build:
+        overview.build_overviews(sourcefile, factors=(4, ))
+    with idfpy.open(sourcefile) as src:
+        values = src.read(masked=True, out_shape=(16, 22), dtype=np.float64)
+    assert values.dtype == np.float64
+    assert values.mask.any()
+
+
+@pytest.mark.parametrize('out_shape', [(0, 22), (16, 0), (-1, 22)])
+def test_read_out_shape_invalid(sourcefile, out_shape):
+    with idfpy.open(sourcefile) as src:
+        with pytest.raises(ValueError):
+            src.read(out_shape=out_shape)
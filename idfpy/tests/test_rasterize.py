@@ -0,0 +1,178 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from idfpy import idf
+from idfpy import io
+from idfpy import rasterize
+
+import numpy as np
+import pytest
+
+import shutil
+import os
+
+
+@pytest.fixture
+def sourcefile(tmpdir):
+    datadir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+    sourcefilename = r'bxk1-d-ck.idf'
+    sourcefile = os.path.join(datadir, sourcefilename)
+    testfile = tmpdir.join(sourcefilename)
+    shutil.copyfile(sourcefile, testfile)
+    return str(testfile)
+
+
+@pytest.fixture
+def header():
+    return {
+        'lahey': 1271, 'ncol': 10, 'nrow': 8,
+        'xmin': 0., 'xmax': 100., 'ymin': 0., 'ymax': 80.,
+        'dmin': 0., 'dmax': 0., 'nodata': -9999.,
+        'ieq': False, 'itb': False, 'ivf': False,
+        'dx': 10., 'dy': 10.,
+        }
+
+
+def polygon(*rings):
+    return {'type': 'Polygon', 'coordinates': [list(r) for r in rings]}
+
+
+def box(xmin, ymin, xmax, ymax):
+    return [(xmin, ymin), (xmax, ymin), (xmax, ymax), (xmin, ymax)]
+
+
+def brute_force(rings, header):
+    '''even-odd point in polygon test of all cell centers'''
+    x, y = idf.cell_centers(header)
+    xx, yy = np.meshgrid(x, y)
+    inside = np.zeros(xx.shape, dtype=bool)
+    for ring in rings:
+        ring = np.asarray(ring, dtype=np.float64)
+        for (x0, y0), (x1, y1) in zip(ring, np.roll(ring, -1, axis=0)):
+            crosses = (y0 <= yy) != (y1 <= yy)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                xc = x0 + (yy - y0) * (x1 - x0) / (y1 - y0)
+            inside ^= crosses & (xx < xc)
+    return inside
+
+
+def test_bucket():
+    rng = np.random.default_rng(5)
+    lines = [{'type': 'LineString', 'coordinates': rng.uniform(-10., 110.,
+        (2, 2)).tolist()} for i in range(50)]
+    lines.append({'type': 'LineString', 'coordinates': [(0., -5.),
+        (0., 105.)]})  # spans all blocks
+    geometries = rasterize.Geometries(lines)
+    x0, y0, x1, y1, index = geometries.segments
+    tops = np.array([100., 90., 45., 44.])
+    bottoms = np.array([90., 45., 44., 0.])
+    buckets = rasterize.bucket(geometries.segments, tops, bottoms)
+    assert len(buckets) == 4
+    for selected, ymax, ymin in zip(buckets, tops, bottoms):
+        is_overlap = ((np.maximum(y0, y1) >= ymin) &
+            (np.minimum(y0, y1) <= ymax))
+        assert sorted(selected[-1]) == sorted(index[is_overlap])
+        assert 50 in selected[-1]
+
+
+def test_centroid_box(header):
+    result = rasterize.rasterize([polygon(box(12., 18., 48., 52.))], header)
+    expected = np.full((8, 10), -9999., dtype=np.float32)
+    expected[3:6, 1:5] = 1.
+    np.testing.assert_array_equal(result, expected)
+    assert result.dtype == np.float32
+
+
+def test_centroid_hole(header):
+    outer = box(0., 0., 80., 80.)
+    hole = box(20., 20., 60., 60.)
+    result = rasterize.rasterize([polygon(outer, hole)], header,
+        blocksize=3)
+    np.testing.assert_array_equal(result == 1.,
+        brute_force([outer, hole], header))
+    assert result[4, 4] == -9999.
+
+
+def test_centroid_random(header):
+    rng = np.random.default_rng(3)
+    angles = np.sort(rng.uniform(0., 2 * np.pi, 12))
+    radius = rng.uniform(15., 40., 12)
+    ring = np.column_stack([50. + radius * np.cos(angles),
+        40. + radius * np.sin(angles)])
+    result = rasterize.rasterize([polygon(ring.tolist())], header,
+        blocksize=2)
+    np.testing.assert_array_equal(result == 1., brute_force([ring], header))
+
+
+def test_all_touched(header):
+    shape = polygon(box(12., 18., 48., 52.))
+    centroid = rasterize.rasterize([shape], header) == 1.
+    touched = rasterize.rasterize([shape], header, mode='all_touched') == 1.
+    assert np.all(touched[centroid])
+    expected = np.zeros((8, 10), dtype=bool)
+    expected[2:7, 1:5] = True
+    np.testing.assert_array_equal(touched, expected)
+
+
+def test_lines_points(header):
+    line = {'type': 'LineString', 'coordinates': [(5., 45.), (95., 45.)]}
+    diagonal = {'type': 'LineString', 'coordinates': [(1., 79.), (39., 41.)]}
+    point = {'type': 'Point', 'coordinates': (55., 5.)}
+    result = rasterize.rasterize([(line, 2.), (diagonal, 3.), (point, 4.)],
+        header, fill=0.)
+    assert np.all(result[3, 4:] == 2.)
+    assert np.all(np.diag(result)[:4] == 3.)  # later shape overwrites
+    assert result[7, 5] == 4.
+    assert np.count_nonzero(result) == 10 + 3 + 1
+
+
+def test_overwrite_order(header):
+    class Shape(object):
+        def __init__(self, geometry):
+            self.__geo_interface__ = geometry
+    first = Shape(polygon(box(0., 0., 60., 80.)))
+    second = {'type': 'Feature', 'properties': {},
+        'geometry': polygon(box(40., 0., 100., 80.))}
+    result = rasterize.rasterize([(first, 1.), (second, 2.)], header)
+    assert np.all(result[:, :4] == 1.)
+    assert np.all(result[:, 4:] == 2.)
+
+
+def test_fraction(header):
+    result = rasterize.rasterize([polygon(box(0., 75., 15., 80.))], header,
+        mode='fraction', supersample=4, fill=0.)
+    assert result[0, 0] == pytest.approx(0.5)
+    assert result[0, 1] == pytest.approx(0.25)
+    assert np.count_nonzero(result) == 2
+    with pytest.raises(ValueError):
+        rasterize.rasterize([{'type': 'Point', 'coordinates': (1., 1.)}],
+            header, mode='fraction')
+
+
+def test_nonequidistant(header):
+    header.update(ieq=True,
+        **{'dx(col)': (5.,) * 4 + (20.,) * 4, 'dy(row)': (10.,) * 8})
+    header['ncol'] = 8
+    ring = box(3., 12., 50., 47.)
+    result = rasterize.rasterize([polygon(ring)], header, blocksize=3)
+    np.testing.assert_array_equal(result == 1., brute_force([ring], header))
+
+
+def test_rasterize_idf(sourcefile, tmpdir):
+    header = io.read_header(sourcefile)
+    xmin, ymax = header['xmin'], header['ymax']
+    shapes = [
+        (polygon(box(xmin + 1000., ymax - 3000., xmin + 5000., ymax - 500.)),
+            5.),
+        ({'type': 'LineString', 'coordinates': [
+            (xmin, ymax - 4000.), (xmin + 8800., ymax - 4500.)]}, 7.),
+        ]
+    outfile = str(tmpdir.join('zones.idf'))
+    rasterize.rasterize_idf(shapes, outfile, sourcefile, blocksize=10)
+    expected = rasterize.rasterize(shapes, header)
+    with idf.IdfFile(outfile) as src:
+        assert src.header['ncol'] == header['ncol']
+        assert src.header['dmin'] == 5.
+        assert src.header['dmax'] == 7.
+        np.testing.assert_array_equal(src.read(), expected)
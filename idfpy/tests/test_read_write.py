@@ -97,3 +97,102 @@ def test_write_twice(sourcefile, destfile):
     assert header == copy_header
     np.testing.assert_array_equal(source, copy)
 
+
+def test_write_ivf(sourcefile, destfile):
+    # read original
+    with idfpy.open(sourcefile) as src:
+        source = src.read(masked=True)
+        header = src.header.copy()
+    header['ivf'] = True
+
+    # write copy
+    with idfpy.open(destfile, 'wb', header=header) as dst:
+        dst.write(source)
+
+    # read copy and compare
+    with idfpy.open(destfile, 'rb') as cpy:
+        copy = cpy.read(masked=True)
+        copy_header = cpy.header
+
+    assert copy_header['ivf']
+    assert header == copy_header
+    np.testing.assert_array_equal(source, copy)
+
+
+def test_write_nonequidistant(sourcefile, destfile):
+    # read original
+    with idfpy.open(sourcefile) as src:
+        source = src.read(masked=True)
+        header = src.header.copy()
+
+    # non-equidistant header, cells widen to the east
+    header['ieq'] = True
+    header['dx(col)'] = tuple(float(50 + c) for c in range(header['ncol']))
+    header['dy(row)'] = tuple(100. for r in range(header['nrow']))
+    del header['dx'], header['dy']
+
+    # write copy
+    with idfpy.open(destfile, 'wb', header=header) as dst:
+        dst.write(source)
+
+    # read copy and compare
+    with idfpy.open(destfile, 'rb') as cpy:
+        copy = cpy.read(masked=True)
+        copy_header = cpy.header
+
+    assert copy_header['dx(col)'] == header['dx(col)']
+    assert np.isclose(copy_header['xmax'], header['xmin'] + 8228.)
+    np.testing.assert_array_equal(source, copy)
+
+
+@pytest.mark.parametrize('dtype', ['<f8', '>f8', '>f4'])
+def test_write_precision_byteorder(sourcefile, destfile, dtype):
+    # read original
+    with idfpy.open(sourcefile) as src:
+        source = src.read(masked=True)
+        header = src.header.copy()
+
+    # write copy in other precision or byte order
+    with idfpy.open(destfile, 'wb', header=header.copy(),
+            dtype=dtype) as dst:
+        dst.write(source)
+
+    # read copy and compare
+    with idfpy.open(destfile, 'rb') as cpy:
+        assert cpy.dtype == np.dtype(dtype)
+        copy = cpy.read(masked=True)
+        copy_header = cpy.header
+        cell = cpy.read_cell(10, 20)
+        rows = cpy.read_rows(5, 10, dtype=np.float32)
+
+    assert copy.dtype == np.dtype(dtype)
+    assert rows.dtype == np.float32
+    assert set(copy_header) == set(header)
+    assert copy_header['lahey'] == (2295 if dtype.endswith('8') else 1271)
+    assert copy_header['ncol'] == header['ncol']
+    assert np.isclose(copy_header['dx'], header['dx'])
+    assert cell == source.data[10, 20]
+    np.testing.assert_array_equal(source, copy)
+    np.testing.assert_array_equal(source.data[5:10], rows)
+
+
+def test_double_layout(sourcefile, destfile):
+    # read original
+    with idfpy.open(sourcefile) as src:
+        source = src.read()
+        header = src.header.copy()
+    header['lahey'] = 2296
+
+    # header markers for double precision select 8 byte values
+    with idfpy.open(destfile, 'wb', header=header) as dst:
+        dst.write(source)
+        assert dst.irec == 88 + 2 * 8
+
+    with open(destfile, 'rb') as f:
+        raw = f.read()
+    assert np.frombuffer(raw[:4], '<i4')[0] == 2296
+    assert np.frombuffer(raw[8:24], '<i8').tolist() == [
+        header['ncol'], header['nrow']]
+    assert len(raw) == 88 + 2 * 8 + source.size * 8
+    np.testing.assert_array_equal(
+        np.frombuffer(raw[104:], '<f8').reshape(source.shape), source)
@@ -0,0 +1,171 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from idfpy import io
+from idfpy import overview
+from idfpy import serve
+import idfpy
+
+import numpy as np
+import pytest
+
+from urllib.error import HTTPError
+from urllib.request import urlopen
+import asyncio
+import json
+import shutil
+import os
+import threading
+import zlib
+
+
+@pytest.fixture
+def sourcefile(tmpdir):
+    datadir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+    sourcefilename = r'bxk1-d-ck.idf'
+    sourcefile = os.path.join(datadir, sourcefilename)
+    testfile = tmpdir.join(sourcefilename)
+    shutil.copyfile(sourcefile, testfile)
+    return str(testfile)
+
+
+@pytest.fixture
+def server(sourcefile):
+    tileserver = serve.TileServer([sourcefile], cache_bytes=2**20, workers=2)
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+    state = {}
+
+    def run():
+        asyncio.set_event_loop(loop)
+        state['server'] = loop.run_until_complete(tileserver.start(port=0))
+        started.set()
+        loop.run_forever()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    started.wait()
+    port = state['server'].sockets[0].getsockname()[1]
+    yield tileserver, port
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    tileserver.close()
+
+
+def decode_png(data):
+    '''decode RGBA PNG written by encode_png'''
+    assert data[:8] == b'\x89PNG\r\n\x1a\n'
+    width, height = np.frombuffer(data[16:24], dtype='>u4')
+    idat_length = int(np.frombuffer(data[33:37], dtype='>u4')[0])
+    raw = zlib.decompress(data[41:41 + idat_length])
+    rows = np.frombuffer(raw, dtype=np.uint8).reshape(height, width * 4 + 1)
+    return rows[:, 1:].reshape(height, width, 4)
+
+
+def test_encode_png():
+    rgba = np.arange(2 * 3 * 4, dtype=np.uint8).reshape(2, 3, 4)
+    np.testing.assert_array_equal(decode_png(serve.encode_png(rgba)), rgba)
+
+
+def test_colorize():
+    rgba = serve.colorize(np.array([0., 1., np.nan]), 0., 1.)
+    np.testing.assert_array_equal(rgba[0], serve.LUT[0])
+    np.testing.assert_array_equal(rgba[1], serve.LUT[255])
+    assert rgba[2, 3] == 0
+
+
+def test_tile_cache():
+    cache = serve.TileCache(max_bytes=10)
+    cache.put('a', b'12345')
+    cache.put('b', b'12345')
+    assert cache.get('a') == b'12345'
+    cache.put('c', b'123')
+    assert cache.get('b') is None
+    assert cache.nbytes == 8
+
+
+def test_render(sourcefile):
+    tileserver = serve.TileServer([sourcefile], tilesize=88)
+    values = tileserver.render('bxk1-d-ck', 0, 0, 0)
+    with idfpy.open(sourcefile) as src:
+        source = src.read(masked=True).filled(np.nan)
+    np.testing.assert_array_equal(values[:66], source)
+    assert np.all(np.isnan(values[66:]))
+
+    # zoomed out tiles read from overview
+    overview.build_overviews(sourcefile, factors=(2, ))
+    tileserver = serve.TileServer([sourcefile], tilesize=44)
+    values = tileserver.render('bxk1-d-ck', 0, 0, 0)
+    with idfpy.open(overview.overview_file(sourcefile, 2)) as ovr:
+        expected = ovr.read(masked=True).filled(np.nan)
+    np.testing.assert_array_equal(values[:33], expected)
+
+
+def test_overviews_looked_up_once(sourcefile, monkeypatch):
+    overview.build_overviews(sourcefile, factors=(2, ))
+    tileserver = serve.TileServer([sourcefile], tilesize=44)
+    calls = []
+    monkeypatch.setattr(overview, 'find_overviews',
+        lambda idffile: calls.append(idffile))
+    for x, y in [(0, 0), (0, 1), (1, 0), (1, 1)]:
+        tileserver.render('bxk1-d-ck', 1, x, y)
+    tileserver.render('bxk1-d-ck', 0, 0, 0)
+    assert not calls
+    tileserver.close()
+
+
+def test_source_changed(sourcefile):
+    overview.build_overviews(sourcefile, factors=(2, ))
+    tileserver = serve.TileServer([sourcefile], tilesize=44)
+    before = tileserver.tile('bxk1-d-ck', 0, 0, 0, fmt='f32')
+    assert len(tileserver.cache) == 1
+
+    # rewrite source, overview is now older and not used
+    header = io.read_header(sourcefile)
+    io.write_array(sourcefile, io.read_array(sourcefile) + 10., header)
+    stat = os.stat(sourcefile)
+    os.utime(sourcefile, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    after = tileserver.tile('bxk1-d-ck', 0, 0, 0, fmt='f32')
+    assert tileserver.layers['bxk1-d-ck'].overviews == {}
+    assert len(tileserver.cache) == 1
+    before = np.frombuffer(before, dtype='<f4')
+    after = np.frombuffer(after, dtype='<f4')
+    assert np.nanmean(after) - np.nanmean(before) == pytest.approx(10.,
+        abs=0.5)
+    tileserver.close()
+
+
+def test_serve(server):
+    tileserver, port = server
+    url = 'http://127.0.0.1:{p:d}'.format(p=port)
+    with urlopen(url + '/layers') as response:
+        layers = json.loads(response.read().decode())
+    assert list(layers['layers']) == ['bxk1-d-ck']
+
+    with urlopen(url + '/bxk1-d-ck/1/0/0.png') as response:
+        assert response.headers['Content-Type'] == 'image/png'
+        rgba = decode_png(response.read())
+    assert rgba.shape == (256, 256, 4)
+
+    with urlopen(url + '/bxk1-d-ck/1/1/1.f32') as response:
+        values = np.frombuffer(response.read(), dtype='<f4')
+    np.testing.assert_array_equal(values,
+        tileserver.render('bxk1-d-ck', 1, 1, 1).ravel())
+
+    with pytest.raises(HTTPError) as error:
+        urlopen(url + '/bxk1-d-ck/1/2/0.png')
+    assert error.value.code == 404
+
+
+def test_benchmark(server):
+    tileserver, port = server
+    paths = serve.tile_paths(tileserver.layers, range(3))
+    result = serve.benchmark(paths, port=port, concurrency=4)
+    assert result['requests'] == len(paths)
+    assert result['errors'] == 0
+
+    # second run is served from cache
+    hits = tileserver.cache.hits
+    serve.benchmark(paths, port=port, concurrency=4)
+    assert tileserver.cache.hits - hits == len(paths)
@@ -0,0 +1,105 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from idfpy import calc
+from idfpy import io
+from idfpy import stackstate
+
+import numpy as np
+import pytest
+
+import os
+
+
+@pytest.fixture
+def sourcefiles(tmpdir):
+    datadir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+    sourcefile = os.path.join(datadir, r'bxk1-d-ck.idf')
+    source = io.read_array(sourcefile)
+    header = io.read_header(sourcefile)
+    sourcefiles = []
+    for i in range(4):
+        testfile = str(tmpdir.join('bxk1-{:d}.idf'.format(i)))
+        io.write_array(testfile, source + i, header.copy())
+        sourcefiles.append(testfile)
+    return sourcefiles
+
+
+def expected(idffiles, method):
+    return calc.agg(*(io.read_array(f) for f in idffiles), method=method)
+
+
+def test_add(sourcefiles, tmpdir):
+    outfile = str(tmpdir.join('mean.idf'))
+    summary = stackstate.update(sourcefiles[:2], outfile, method='mean')
+    assert summary['recomputed']
+    assert os.path.exists(stackstate.state_file(outfile))
+
+    summary = stackstate.update(sourcefiles, outfile, method='mean')
+    assert not summary['recomputed']
+    assert summary['added'] == sourcefiles[2:]
+    np.testing.assert_allclose(io.read_array(outfile),
+        expected(sourcefiles, 'mean'), rtol=1e-6)
+
+
+def test_unchanged(sourcefiles, tmpdir):
+    outfile = str(tmpdir.join('sum.idf'))
+    stackstate.update(sourcefiles, outfile, method='sum')
+    summary = stackstate.update(sourcefiles, outfile, method='sum',
+        use_hash=False)
+    assert not summary['recomputed']
+    assert not summary['added']
+    np.testing.assert_allclose(io.read_array(outfile),
+        expected(sourcefiles, 'sum'), rtol=1e-6)
+
+
+def test_remove(sourcefiles, tmpdir):
+    outfile = str(tmpdir.join('sum.idf'))
+    stackstate.update(sourcefiles, outfile, method='sum')
+    summary = stackstate.update(sourcefiles[1:], outfile, method='sum')
+    assert not summary['recomputed']
+    assert summary['removed'] == sourcefiles[:1]
+    np.testing.assert_allclose(io.read_array(outfile),
+        expected(sourcefiles[1:], 'sum'), rtol=1e-6)
+
+    # min is invalid after removal and needs full recompute
+    summary = stackstate.update(sourcefiles[1:], outfile, method='min')
+    assert summary['recomputed']
+    np.testing.assert_allclose(io.read_array(outfile),
+        expected(sourcefiles[1:], 'min'))
+
+
+def test_changed(sourcefiles, tmpdir):
+    outfile = str(tmpdir.join('max.idf'))
+    stackstate.update(sourcefiles, outfile, method='max', use_hash=True)
+    header = io.read_header(sourcefiles[0])
+    io.write_array(sourcefiles[0], io.read_array(sourcefiles[0]) + 10.,
+        header)
+    summary = stackstate.update(sourcefiles, outfile, method='max',
+        use_hash=True)
+    assert summary['recomputed']
+    assert summary['changed'] == sourcefiles[:1]
+    np.testing.assert_allclose(io.read_array(outfile),
+        expected(sourcefiles, 'max'))
+
+
+def test_rejected(sourcefiles, tmpdir):
+    outfile = str(tmpdir.join('mean.idf'))
+    header = io.read_header(sourcefiles[0])
+    otherfile = str(tmpdir.join('other.idf'))
+    io.write_array(otherfile, io.read_array(sourcefiles[0])[:10], header)
+    idffiles = sourcefiles + [otherfile]
+    summary = stackstate.update(idffiles, outfile, method='mean')
+    assert summary['rejected'] == [otherfile]
+    assert otherfile not in summary['added']
+
+    summary = stackstate.update(idffiles, outfile, method='mean')
+    assert not summary['recomputed']
+    assert not summary['added']
+    assert summary['rejected'] == [otherfile]
+
+    summary = stackstate.update(sourcefiles, outfile, method='mean')
+    assert not summary['rejected']
+    np.testing.assert_allclose(io.read_array(outfile),
+        expected(sourcefiles, 'mean'), rtol=1e-6)
@@ -0,0 +1,137 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from idfpy import io
+from idfpy import stats
+
+import numpy as np
+import pytest
+
+import shutil
+import os
+
+
+@pytest.fixture
+def sourcefile(tmpdir):
+    datadir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+    sourcefilename = r'bxk1-d-ck.idf'
+    sourcefile = os.path.join(datadir, sourcefilename)
+    testfile = tmpdir.join(sourcefilename)
+    shutil.copyfile(sourcefile, testfile)
+    return str(testfile)
+
+
+def test_running_stats():
+    values = np.random.default_rng(1).normal(1e6, 2., size=1000)
+    running = stats.RunningStats()
+    for block in np.array_split(values, 7):
+        running.add(block)
+    assert running.count == 1000
+    assert running.mean == pytest.approx(values.mean())
+    assert running.var == pytest.approx(values.var())
+    assert running.min == values.min()
+
+    # merge of two halves equals single pass
+    first, second = stats.RunningStats(), stats.RunningStats()
+    first.add(values[:300])
+    second.add(values[300:])
+    first.merge(second)
+    assert first.mean == pytest.approx(running.mean)
+    assert first.var == pytest.approx(running.var)
+
+
+def test_describe(sourcefile):
+    values = io.read_array(sourcefile).compressed().astype(np.float64)
+    result = stats.describe(sourcefile, bins=50, blocksize=7)
+    assert result['count'] == values.size
+    assert result['nodata'] == 66 * 88 - values.size
+    assert result['min'] == pytest.approx(values.min())
+    assert result['max'] == pytest.approx(values.max())
+    assert result['mean'] == pytest.approx(values.mean())
+    assert result['std'] == pytest.approx(values.std())
+    counts, edges = result['histogram']
+    assert counts.sum() == values.size
+    assert len(edges) == 51
+    for q, value in result['percentiles'].items():
+        assert abs(value - np.percentile(values, q)) <= \
+            result['percentile_error']
+
+
+def test_describe_range(sourcefile):
+    values = io.read_array(sourcefile).compressed().astype(np.float64)
+    result = stats.describe(sourcefile, bins=30, hist_range=(0., 3.))
+    counts, edges = result['histogram']
+    assert edges[0] == 0. and edges[-1] == 3.
+    assert counts.sum() < result['count']
+    assert result['underflow'] == np.count_nonzero(values < 0.)
+    assert result['overflow'] == np.count_nonzero(values > 3.)
+    assert (counts.sum() + result['underflow'] + result['overflow'] ==
+        result['count'])
+    for q, value in result['percentiles'].items():
+        exact = np.percentile(values, q)
+        if exact > 3.:
+            assert value == np.inf
+        else:
+            assert abs(value - exact) <= result['percentile_error']
+
+
+def test_describe_range_single_pass(sourcefile, monkeypatch):
+    passes = []
+    iter_blocks = stats.idf.IdfFile.iter_blocks
+
+    def counting(self, *args, **kwargs):
+        passes.append(1)
+        return iter_blocks(self, *args, **kwargs)
+    monkeypatch.setattr(stats.idf.IdfFile, 'iter_blocks', counting)
+    ranged = stats.describe(sourcefile, bins=10, hist_range=(0., 5.))
+    assert len(passes) == 1
+    full = stats.describe(sourcefile, bins=10)
+    assert len(passes) == 3
+    assert ranged['mean'] == full['mean']
+
+
+def test_refresh_header(sourcefile):
+    array = io.read_array(sourcefile)
+
+    # overwrite dmin and dmax in header
+    with open(sourcefile, 'r+b') as f:
+        f.seek(28)
+        f.write(np.array([-1., 100.], dtype=np.float32).tobytes())
+    assert io.read_header(sourcefile)['dmin'] == -1.
+
+    stats.describe(sourcefile, refresh=True)
+    header = io.read_header(sourcefile)
+    assert header['dmin'] == pytest.approx(array.min())
+    assert header['dmax'] == pytest.approx(array.max())
+    np.testing.assert_array_equal(io.read_array(sourcefile), array)
+
+
+@pytest.mark.parametrize('method', ['strided', 'random'])
+def test_describe_sample(sourcefile, method):
+    values = io.read_array(sourcefile).compressed()
+    result = stats.describe_sample(sourcefile, fraction=0.5, method=method,
+        seed=1)
+    assert result['rows'] == 33
+    assert result['min'] >= values.min()
+    assert result['max'] <= values.max()
+    assert abs(result['mean'] - values.mean()) <= 2 * result['mean_error']
+    assert 0. < result['percentile_rank_error'] < 1.
+
+
+def test_describe_sample_all_rows(sourcefile):
+    values = io.read_array(sourcefile).compressed()
+    result = stats.describe_sample(sourcefile, fraction=1.)
+    assert result['mean'] == pytest.approx(values.mean())
+    assert result['mean_error'] == pytest.approx(0.)
+    assert result['count'] == values.size
+
+
+def test_describe_files(sourcefile, tmpdir):
+    copyfile = str(tmpdir.join('copy.idf'))
+    shutil.copyfile(sourcefile, copyfile)
+    results = stats.describe_files(str(tmpdir.join('*.idf')), workers=2)
+    assert sorted(results) == sorted([sourcefile, copyfile])
+    assert results[sourcefile]['mean'] == results[copyfile]['mean']
+    results = stats.describe_files([sourcefile], fraction=0.2)
+    assert results[sourcefile]['rows'] == 14
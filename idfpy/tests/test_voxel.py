@@ -0,0 +1,69 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from idfpy import io
+from idfpy import voxel
+
+import numpy as np
+import pytest
+
+import os
+
+
+@pytest.fixture
+def slicefiles(tmpdir):
+    datadir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+    sourcefile = os.path.join(datadir, r'bxk1-d-ck.idf')
+    source = io.read_array(sourcefile)
+    slicefiles = []
+    for i in range(5):
+        header = io.read_header(sourcefile)
+        header.update(itb=True, top=-0.5 * i, bot=-0.5 * (i + 1))
+        slicefile = str(tmpdir.join('slice_{:d}.idf'.format(i)))
+        io.write_array(slicefile, source + i, header)
+        slicefiles.append(slicefile)
+    return slicefiles
+
+
+def test_order(slicefiles):
+    model = voxel.VoxelModel(slicefiles[::-1])
+    assert model.shape == (5, 66, 88)
+    assert model.idffiles == slicefiles
+    np.testing.assert_allclose(model.tops, [0., -0.5, -1., -1.5, -2.])
+
+
+def test_profile(slicefiles):
+    model = voxel.VoxelModel(slicefiles)
+    tops, bots, values = model.profile(256060., 483140.)
+    np.testing.assert_allclose(values, 3.6234 + np.arange(5), atol=1e-4)
+    np.testing.assert_allclose(bots, tops - 0.5)
+
+    tops, bots, values = model.profile(252550., 486450.)
+    assert np.all(np.isnan(values))
+
+
+def test_depth_slice(slicefiles):
+    model = voxel.VoxelModel(slicefiles, cachesize=2)
+    expected = io.read_array(slicefiles[2])
+    np.testing.assert_array_equal(model.depth_slice(-1.2), expected)
+    assert model.depth_slice(-3.) is None
+    assert model.layer_at(0.) == 0
+    assert model.layer_at(-0.5) == 0
+    assert model.layer_at(0.1) is None
+    assert np.isclose(model.value_at(256060., 483140., -1.2), 5.6234,
+        atol=1e-4)
+
+    for z in (0., -0.5, -1.):
+        model.depth_slice(z - 0.1)
+    assert list(model._cache) == [1, 2]
+
+
+@pytest.mark.parametrize('field,change', [('xmin', 100.), ('dx', -50.)])
+def test_grid_mismatch(slicefiles, tmpdir, field, change):
+    header = io.read_header(slicefiles[0])
+    header[field] += change
+    otherfile = str(tmpdir.join('other.idf'))
+    io.write_array(otherfile, io.read_array(slicefiles[0]), header)
+    with pytest.raises(ValueError):
+        voxel.VoxelModel(slicefiles + [otherfile])
@@ -0,0 +1,133 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tom van Steijn, Royal HaskoningDHV
+
+from idfpy import idf
+
+import numpy as np
+
+from collections import OrderedDict
+import glob
+import threading
+
+
+class VoxelModel(object):
+    """3D model from a set of Idf files with top and bottom (itb=True)
+
+    Slices are indexed from their headers only and ordered from top to
+    bottom. Data is read when needed: single cells for vertical profiles,
+    whole slices for depth slices. The most recently used slices are kept
+    in memory.
+    """
+    def __init__(self, idffiles, cachesize=16):
+        headers = []
+        for idffile in idffiles:
+            with idf.IdfFile(str(idffile)) as src:
+                if not src.header['itb']:
+                    raise ValueError('{f:} has no top and bot (itb=False)'
+                        .format(f=idffile))
+                headers.append(src.header)
+        if not headers:
+            raise ValueError('no Idf files for voxel model')
+        for idffile, header in zip(idffiles, headers):
+            if not idf.same_grid(header, headers[0]):
+                raise ValueError('grid of {f:} does not match'.format(
+                    f=idffile))
+
+        # order slices from top to bottom
+        order = sorted(range(len(headers)), key=lambda i: -headers[i]['top'])
+        self.idffiles = [str(idffiles[i]) for i in order]
+        self.headers = [headers[i] for i in order]
+        self.tops = np.array([h['top'] for h in self.headers])
+        self.bots = np.array([h['bot'] for h in self.headers])
+
+        self.cachesize = cachesize
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '{s.__class__.__name__:}(shape={s.shape:})'.format(s=self)
+
+    def __len__(self):
+        return len(self.idffiles)
+
+    @classmethod
+    def from_pattern(cls, pattern, cachesize=16):
+        """voxel model from Idf files matching glob pattern"""
+        return cls(sorted(glob.glob(pattern)), cachesize=cachesize)
+
+    @property
+    def header(self):
+        return self.headers[0]
+
+    @property
+    def shape(self):
+        return len(self), self.header['nrow'], self.header['ncol']
+
+    def layer_at(self, z):
+        """index of slice with bot <= z < top or None
+
+        The top of the highest slice is included in that slice.
+        """
+        is_below_top = (z < self.tops) | (z == self.tops[0])
+        index = np.flatnonzero((self.bots <= z) & is_below_top)
+        if len(index):
+            return int(index[0])
+
+    def read_layer(self, index, masked=True):
+        """read slice by index, kept in cache of recently used slices"""
+        with self._lock:
+            if index in self._cache:
+                self._cache.move_to_end(index)
+                values = self._cache[index]
+            else:
+                values = None
+        if values is None:
+            with idf.IdfFile(self.idffiles[index]) as src:
+                values = src.read(masked=True, dtype=src.native_dtype)
+            with self._lock:
+                self._cache[index] = values
+                while len(self._cache) > self.cachesize:
+                    self._cache.popitem(last=False)
+        if masked:
+            return values
+        else:
+            return values.filled(self.headers[index]['nodata'])
+
+    def read_cell(self, index, row, col):
+        """read single cell value of slice, NaN for nodata"""
+        with self._lock:
+            values = self._cache.get(index)
+        if values is not None:
+            value = values[row, col]
+            return np.nan if value is np.ma.masked else float(value)
+        with idf.IdfFile(self.idffiles[index]) as src:
+            value = src.read_cell(row, col)
+        if value == self.headers[index]['nodata']:
+            return np.nan
+        return value
+
+    def profile(self, x, y):
+        """tops, bots and values of all slices in vertical column at x, y"""
+        row, col, is_valid = idf.cell_indices(self.header, x, y)
+        if not is_valid:
+            raise ValueError(
+                'coordinate pair x, y = {x:.3f}, {y:.3f} out of bounds'
+                .format(x=x, y=y))
+        values = np.array([self.read_cell(i, int(row), int(col))
+            for i in range(len(self))])
+        return self.tops.copy(), self.bots.copy(), values
+
+    def value_at(self, x, y, z):
+        """value at x, y, z, NaN if outside model or nodata"""
+        index = self.layer_at(z)
+        row, col, is_valid = idf.cell_indices(self.header, x, y)
+        if index is None or not is_valid:
+            return np.nan
+        return self.read_cell(index, int(row), int(col))
+
+    def depth_slice(self, z, masked=True):
+        """horizontal slice at elevation z, None if z is outside model"""
+        index = self.layer_at(z)
+        if index is not None:
+            return self.read_layer(index, masked=masked)
@@ -71,13 +71,16 @@ setup(
     # your project is installed. For an analysis of "install_requires" vs pip's
     # requirements files see:
     # https://packaging.python.org/en/latest/requirements.html
-    install_requires=['numpy', 'rasterio', 'click'],
+    install_requires=['numpy', 'click'],
 
     # List additional groups of dependencies here (e.g. development
     # dependencies). You can install these using the following syntax,
     # for example:
     # $ pip install -e .[dev,test]
     extras_require={
+        'raster': ['rasterio'],
+        'yaml': ['pyyaml'],
+        'dask': ['dask[array]', 'xarray'],
         # 'dev': ['check-manifest'],
         # 'test': ['coverage'],
     },
@@ -100,9 +103,13 @@ setup(
     # pip to create the appropriate form of executable for the target platform.
     entry_points={
         'console_scripts': [
+        'idfpy=idfpy.cli:main',
         'idfstack=idfpy.cli:stack',
         'idf2tif=idfpy.cli:idf2tif',
         'idf2asc=idfpy.cli:idf2asc',
+        'idf2xyz=idfpy.cli:idf2xyz',
+        'idfserve=idfpy.cli:idfserve',
+        'idfdiff=idfpy.cli:idfdiff',
         ],
     },
 )